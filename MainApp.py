@@ -10,13 +10,13 @@ import pandas as pd
 
 from copy import deepcopy
 
-from PyQt5.QtCore import QCoreApplication, Qt, QItemSelectionModel
+from PyQt5.QtCore import QCoreApplication, Qt, QItemSelectionModel, QTimer
 from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QMessageBox,\
     QWidget, QMenu, QAction, QToolButton, QUndoStack, QShortcut, QStyle
 from PyQt5.QtGui import QIcon, QCloseEvent, QStandardItem, QStandardItemModel, QMouseEvent
 
 from utility import exception_hook, load_save_functions, treeView_functions, qthreads, drag_drop_tree_view, number_formatting, variables_handling, \
-    add_remove_table
+    add_remove_table, step_statistics
 from bluesky_handling import protocol_builder, make_catalog
 from EPICS_handling import make_ioc
 
@@ -71,8 +71,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # self.textEdit_console_output_meas.setHidden(True)
 
         # measurements
-        self.run_thread = qthreads.Run_Protocol()
+        self.run_thread = None
+        self.spare_run_thread = None
+        self.retired_run_threads = []
         self.make_new_run_thread()
+        self.step_statistics = step_statistics.Step_Statistics(f'{load_save_functions.appdata_path}/step_statistics.json')
+        self.progress_estimator = None
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(1000)
+        self.progress_timer.timeout.connect(self.update_protocol_progress)
         self.protocols_dict = {}
         self.item_model_protocols = QStandardItemModel(0,1)
         self.listView_protocols.setModel(self.item_model_protocols)
@@ -212,6 +219,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.ioc_thread.terminate()
         if self.run_thread:
             self.run_thread.terminate()
+        if self.spare_run_thread:
+            self.spare_run_thread.terminate()
+        for thread in self.retired_run_threads:
+            thread.terminate()
         if self.make_thread:
             self.make_thread.terminate()
         if self.preferences['autosave']:
@@ -226,6 +237,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.ioc_thread.terminate()
         if self.run_thread:
             self.run_thread.terminate()
+        if self.spare_run_thread:
+            self.spare_run_thread.terminate()
+        for thread in self.retired_run_threads:
+            thread.terminate()
         if self.make_thread:
             self.make_thread.terminate()
         if self.preferences['autosave']:
@@ -531,18 +546,50 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.pushButton_run_protocol.setEnabled(True)
 
     def make_new_run_thread(self):
-        self.run_thread = qthreads.Run_Protocol()
-        self.run_thread.start()
+        """Starts a new runner in the background, that waits with all
+        imports done for the next protocol (the spare_run_thread)."""
+        self.spare_run_thread = qthreads.Run_Protocol()
+        self.spare_run_thread.start()
+        self.spare_run_thread.finished.connect(self.run_thread_finished)
+        devices = variables_handling.devices.values()
+        self.spare_run_thread.preload([f'{dev.name}.{dev.name}_ophyd' for dev in devices],
+                                      [variables_handling.device_driver_path])
+
+    def activate_spare_run_thread(self):
+        """Uses the spare_run_thread for the next protocol and starts a
+        new spare one. The previous runner keeps its plots open, but is
+        not connected to the GUI anymore."""
+        if self.run_thread is not None:
+            self.run_thread.sig_step.disconnect()
+            self.run_thread.info_step.disconnect()
+            self.run_thread.protocol_done.disconnect()
+            self.run_thread.step_started.disconnect()
+            self.run_thread.run_ended.disconnect()
+            self.retired_run_threads.append(self.run_thread)
+        if self.spare_run_thread is None:
+            self.make_new_run_thread()
+        self.run_thread = self.spare_run_thread
         self.run_thread.sig_step.connect(self.change_progressBar_value_meas)
         self.run_thread.info_step.connect(self.update_protocol_output)
-        self.run_thread.finished.connect(self.run_thread_finished)
         self.run_thread.protocol_done.connect(self.protocol_finished)
+        self.run_thread.step_started.connect(self.protocol_step_started)
+        self.run_thread.run_ended.connect(self.protocol_run_ended)
+        self.make_new_run_thread()
 
     def run_thread_finished(self):
+        """Called when a runner exited. If it was the spare one (i.e. it
+        crashed after starting up), a new one is started."""
         # self.pushButton_run_protocol.setText('Build and run selected protocol')
-        self.run_thread = None
-        self.protocol_finished()
-        self.make_new_run_thread()
+        thread = self.sender()
+        if thread in self.retired_run_threads:
+            self.retired_run_threads.remove(thread)
+        elif thread is self.spare_run_thread:
+            self.spare_run_thread = None
+            if thread.startup_time is not None:
+                self.make_new_run_thread()
+        elif thread is self.run_thread:
+            self.run_thread = None
+            self.protocol_finished()
 
     def make_thread_finished(self):
         self.make_thread = None
@@ -563,6 +610,28 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """Sets the progressBar_protocols to the given val."""
         self.progressBar_protocols.setValue(val)
 
+    def protocol_step_started(self, name):
+        if self.progress_estimator is not None:
+            self.progress_estimator.step_started(name)
+            self.update_protocol_progress()
+
+    def update_protocol_progress(self):
+        """Shows the progress, ETA and throughput of the running
+        protocol in the progressBar_protocols."""
+        if self.progress_estimator is None:
+            return
+        percent, text = self.progress_estimator.get_progress_text()
+        self.progressBar_protocols.setValue(percent)
+        self.progressBar_protocols.setFormat(text)
+
+    def protocol_run_ended(self, aborted):
+        """Adds the measured step durations to the statistics."""
+        self.progress_timer.stop()
+        if self.progress_estimator is not None:
+            self.progress_estimator.finish(aborted=aborted)
+            self.progress_estimator = None
+        self.progressBar_protocols.setFormat('%p%')
+
     # --------------------------------------------------
     # devices methods
     # --------------------------------------------------
@@ -803,19 +872,25 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """Calls the Run_Protocol QThread. The currently selected
         protocol is used. If the button is clicked agian, the thread is
         terminated."""
-        if self.run_thread is None:
-            self.make_new_run_thread()
-        elif self.run_thread.paused:
+        if self.run_thread is not None and self.run_thread.paused:
             self.run_thread.resume()
+            if self.progress_estimator is not None:
+                self.progress_estimator.resume()
             self.pushButton_run_protocol.setEnabled(False)
             self.pushButton_pause_protocol.setEnabled(True)
             self.pushButton_run_protocol.setText('Run')
             return
         self.build_current_protocol(put100=False)
         self.setCursor(Qt.WaitCursor)
+        self.activate_spare_run_thread()
         path = f"{self.preferences['py_files_path']}/{self.current_protocol.name}.py"
         # self.pushButton_run_protocol.setText('Abort Run')
-        self.run_thread.run_protocol(path, self.current_protocol.get_total_steps())
+        self.progress_estimator = step_statistics.Progress_Estimator(self.current_protocol.name,
+                                                                     self.current_protocol.get_step_info(),
+                                                                     self.step_statistics)
+        self.progress_estimator.start()
+        self.progress_timer.start()
+        self.run_thread.run_protocol(path)
         self.pushButton_run_protocol.setEnabled(False)
         self.pushButton_pause_protocol.setEnabled(True)
         self.pushButton_stop_protocol.setEnabled(True)
@@ -834,6 +909,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def pause_protocol(self):
         if self.run_thread is not None:
             self.run_thread.pause()
+            if self.progress_estimator is not None:
+                self.progress_estimator.pause()
             self.pushButton_run_protocol.setText('Resume')
             self.pushButton_run_protocol.setEnabled(True)
             self.pushButton_pause_protocol.setEnabled(False)
@@ -866,9 +943,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         userdata = {'name': 'default_user'} if user == 'default_user' else self.userdata[user]
         sampledata = {'name': 'default_sample'} if sample == 'default_sample' else self.sampledata[sample]
         savepath = f'{self.preferences["meas_files_path"]}/{user}/{sample}/{self.current_protocol.filename or "data"}.h5'
-        protocol_builder.build_protocol(self.current_protocol, path, savepath,
-                                        userdata=userdata, sampledata=sampledata)
-        self.textEdit_console_output_meas.append('\n\nBuild successfull!\n')
+        built = protocol_builder.build_protocol(self.current_protocol, path,
+                                                savepath, userdata=userdata,
+                                                sampledata=sampledata)
+        if built:
+            self.textEdit_console_output_meas.append('\n\nBuild successfull!\n')
+        else:
+            self.textEdit_console_output_meas.append('\n\nProtocol unchanged, using existing build.\n')
         self.progressBar_protocols.setValue(100 if put100 else 1)
 
     def tree_click_sequence(self, general=False):
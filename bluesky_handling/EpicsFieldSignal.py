@@ -1,8 +1,12 @@
-from ophyd import Signal
+import time
+import threading
+
+from ophyd import Signal, Device
+from ophyd.status import Status
 
 import numpy as np
 
-from epics import caput, caget
+from epics import caput, caget, get_pv, ca
 
 
 class EpicsFieldSignal(Signal):
@@ -11,7 +15,7 @@ class EpicsFieldSignal(Signal):
                  parent=None, labels=None, kind='hinted', tolerance=None,
                  rtolerance=None, metadata=None, cl=None, attr_name='',
                  conversion_function=None, set_conversion_function=None,
-                 putFunc=None):
+                 putFunc=None, monitor=False, max_age=None):
         """
         Parameters
         ----------
@@ -48,6 +52,14 @@ class EpicsFieldSignal(Signal):
         putFunc : function, default lambda x: x
             A function to be called when the value is put (e.g. to
             connect to other Signals)
+        monitor : bool, default False
+            If True, a CA monitor on the PV keeps the latest value, which
+            is returned by `get` instead of reading the PV each time.
+        max_age : float, default None
+            Only used with `monitor`. If the last monitor update is older
+            than `max_age` seconds (or the PV is disconnected), the value
+            is read actively. If None, the monitored value is used as
+            long as the PV is connected.
         """
         super().__init__(name=name, value=value, timestamp=timestamp, parent=parent, labels=labels, kind=kind, tolerance=tolerance, rtolerance=rtolerance, metadata=metadata, cl=cl, attr_name=attr_name)
         self.read_pv_name = read_pv_name
@@ -61,6 +73,12 @@ class EpicsFieldSignal(Signal):
         if putFunc is None:
             putFunc = lambda x: x
         self.putFunc = putFunc
+        self.monitor = monitor
+        self.max_age = max_age
+        self.monitor_pv = None
+        self.monitor_index = None
+        # (value, CA-timestamp, time of arrival) of the last update
+        self.monitored = None
 
     def just_readback(self):
         """Only returns the currently stored readback-value."""
@@ -68,15 +86,58 @@ class EpicsFieldSignal(Signal):
 
     def get(self):
         """Reads the Signals value. If there is a `conversion_function`,
-        the value is transformed by it."""
+        the value is transformed by it. While its parent device is read
+        by a Field_Group_Reader (see Field_Group_Device), the value is
+        taken from there, otherwise the PV is read directly."""
         if self.read_pv_name is not None:
-            getval = caget(self.read_pv_name)
+            getval = self.get_monitored_value()
+            if getval is None and not self.monitor:
+                reader = self.get_group_reader()
+                if reader is not None:
+                    getval = reader.get_value(self)
+            if getval is None:
+                getval = caget(self.read_pv_name)
+                if self.monitor and getval is not None:
+                    now = time.time()
+                    self.monitored = (getval, now, now)
             if self.put_values is not None and type(getval) in [int, float, np.float64] and np.abs(getval - self.put_values[1]) <= 1e-3 * getval:
                 self._readback = self.put_values[0]
             else:
                 self._readback = self.conversion_function(getval)
         return super().get()
 
+    def get_monitored_value(self):
+        """Returns the latest monitored value, None if not monitored, not
+        connected or older than `max_age`. Subscribes the monitor at the
+        first call (or if `read_pv_name` changed)."""
+        if not self.monitor:
+            return None
+        if self.monitor_pv is None or self.monitor_pv.pvname != self.read_pv_name:
+            if self.monitor_pv is not None:
+                self.monitor_pv.remove_callback(self.monitor_index)
+            self.monitored = None
+            self.monitor_pv = get_pv(self.read_pv_name, auto_monitor=True)
+            self.monitor_index = self.monitor_pv.add_callback(self.monitor_callback)
+            self.monitor_pv.wait_for_connection()
+        monitored = self.monitored
+        if monitored is None or not self.monitor_pv.connected:
+            return None
+        value, timestamp, arrival = monitored
+        if self.max_age is not None and time.time() - arrival > self.max_age:
+            return None
+        self._metadata['timestamp'] = timestamp
+        return value
+
+    def monitor_callback(self, value=None, timestamp=None, **kwargs):
+        self.monitored = (value, timestamp or time.time(), time.time())
+
+    def get_group_reader(self):
+        """The active Field_Group_Reader of the parent device, None if
+        the parent is not being read by one."""
+        if self.parent is None:
+            return None
+        return getattr(self.parent, '_field_group_reader', None)
+
     def put(self, value, *, timestamp=None, force=False, metadata=None,
             **kwargs):
         """Puts the Signals value. If there is a `set_conversion_function`,
@@ -84,12 +145,142 @@ class EpicsFieldSignal(Signal):
         self.putFunc(value)
         val = self.set_conversion_function(value)
         if self.read_pv_name is not None:
+            reader = self.get_group_reader()
+            if reader is not None:
+                reader.discard(self)
             caput(self.read_pv_name, val, wait=True)
             self.put_values = (value, val)
         super().put(val, timestamp=timestamp, force=force, metadata=metadata, **kwargs)
 
+    def set(self, value, *, timeout=None, settle_time=None, **kwargs):
+        """Puts the value without waiting for the IOC. The returned
+        Status is finished by the put-completion callback of the PV, so
+        several signals can be set at once and waited for together
+        (e.g. with `bps.abs_set(..., group=...)` and `bps.wait`)."""
+        if self.read_pv_name is None:
+            return super().set(value, timeout=timeout,
+                               settle_time=settle_time, **kwargs)
+        self.putFunc(value)
+        val = self.set_conversion_function(value)
+        reader = self.get_group_reader()
+        if reader is not None:
+            reader.discard(self)
+        status = Status(self, timeout=timeout, settle_time=settle_time)
+
+        def put_done(**kwargs):
+            self.put_values = (value, val)
+            try:
+                Signal.put(self, val)
+            except Exception as e:
+                status.set_exception(e)
+            else:
+                status.set_finished()
+
+        pv = get_pv(self.read_pv_name)
+        if not pv.wait_for_connection():
+            status.set_exception(TimeoutError(f'{self.read_pv_name} is not connected'))
+            return status
+        pv.put(val, use_complete=True, callback=put_done)
+        return status
+
 class EpicsFieldSignalRO(EpicsFieldSignal):
     """The read-only implementation of EpicsFieldSignal. The only
     difference is that it raises an error, when one tries to put a value."""
     def put(self, value, *, timestamp=None, force=False, metadata=None, **kwargs):
-        raise Exception('EpicsFieldSignalRO does not support putting a value!')
\ No newline at end of file
+        raise Exception('EpicsFieldSignalRO does not support putting a value!')
+
+    def set(self, value, **kwargs):
+        raise Exception('EpicsFieldSignalRO does not support putting a value!')
+
+
+class Field_Group_Reader:
+    """Reads all EpicsFieldSignals of a `device` together: the CA-gets
+    of all fields are issued at once and waited for once, using
+    persistent PV objects. So reading all fields of a device costs about
+    one network round-trip instead of one per field.
+
+    Only active as context manager (see Field_Group_Device): the fields
+    are fetched at the first `get` inside the with-block and these
+    values are used until it is left. Outside, each signal reads its PV
+    by itself.
+
+    Parameters
+    ----------
+    device : ophyd.Device
+        The device, whose EpicsFieldSignal-components are read.
+    timeout : float, default 5
+        Timeout for connecting and reading the PVs.
+    """
+    def __init__(self, device, timeout=5):
+        self.device = device
+        self.signals = []
+        for attr in device.component_names:
+            signal = getattr(device, attr)
+            if isinstance(signal, EpicsFieldSignal) and not signal.monitor:
+                self.signals.append(signal)
+        self.timeout = timeout
+        self.values = None
+        self.depth = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.depth += 1
+            self.device._field_group_reader = self
+        return self
+
+    def __exit__(self, *args):
+        with self.lock:
+            self.depth -= 1
+            if not self.depth:
+                self.device._field_group_reader = None
+                self.values = None
+
+    def get_value(self, signal):
+        """Returns the value of `signal`, None if it could not be read
+        (the signal then reads it by itself)."""
+        with self.lock:
+            if self.values is None:
+                self.fetch()
+            return self.values.get(signal, None)
+
+    def discard(self, signal):
+        """Drops the fetched value of `signal`, e.g. when it is put."""
+        with self.lock:
+            if self.values is not None:
+                self.values.pop(signal, None)
+
+    def fetch(self):
+        """Reads all fields, waiting only once for the answers."""
+        pvs = {}
+        for signal in self.signals:
+            if signal.read_pv_name is not None:
+                pvs[signal] = get_pv(signal.read_pv_name)
+        pending = {}
+        for signal, pv in pvs.items():
+            if pv.wait_for_connection(timeout=self.timeout):
+                ca.get(pv.chid, wait=False)
+                pending[signal] = pv
+        self.values = {}
+        for signal, pv in pending.items():
+            value = ca.get_complete(pv.chid, timeout=self.timeout)
+            if value is not None:
+                self.values[signal] = value
+
+
+class Field_Group_Device(Device):
+    """Device whose `read` and `read_configuration` read all its
+    EpicsFieldSignals together with one Field_Group_Reader. Single
+    `get`s of the signals are not affected."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._field_group_reader = None
+        self.field_group = Field_Group_Reader(self)
+
+    def read(self):
+        with self.field_group:
+            return super().read()
+
+    def read_configuration(self):
+        with self.field_group:
+            return super().read_configuration()
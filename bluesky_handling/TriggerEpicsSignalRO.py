@@ -1,5 +1,10 @@
-from ophyd import EpicsSignalRO
-from ophyd.status import Status
+import time
+import math
+import bisect
+from functools import reduce, partial
+
+from ophyd import EpicsSignalRO, Device, Kind
+from ophyd.status import Status, AndStatus
 
 
 class TriggerEpicsSignalRO(EpicsSignalRO):
@@ -19,31 +24,133 @@ class TriggerEpicsSignalRO(EpicsSignalRO):
         set to True if the MDEL field of the corresponding record is not
         set to "-1". The status returned from the trigger function is
         then directly set to finished
+
+    Each trigger gets a sequence number and is put with a completion
+    callback, so its status is only finished when the processing of this
+    very trigger is done, late answers to earlier (timed out) triggers
+    are ignored. The time from put to completion is collected in
+    `trigger_latency`.
     """
     def __init__(self, read_pv, *, timeout=10, string=False, name=None,
                  no_mdel=False, **kwargs):
         super().__init__(read_pv, string=string, name=name, timeout=timeout, auto_monitor=False, **kwargs)
         self.stat = None
         self.trigger_pv = self.cl.get_pv(f'{read_pv}:trig')
-        self.subscribe(self.callback_method)
         self.last_time = self.timestamp
+        self.trigger_seq = 0
+        # sequence number -> (status, time of the put)
+        self.pending_triggers = {}
+        self.trigger_latency = Latency_Histogram()
         self.no_mdel = no_mdel
         self.triggering = True
-
-    def callback_method(self, **kwargs):
-        """If there is a status object from the trigger-method, it will
-        be set to finished."""
-        if self.stat is not None and not self.no_mdel and self.triggering:
-            self.stat.set_finished()
-            # self.stat = None
+        # the part of a group trigger, see trigger_group
+        self.pending_status = None
 
     def trigger(self):
         """Returns a status object that will be set to finished, when
         the PV-value is updated. Sets the trigger-PV to 1, thus
-        triggering the process of the original PV."""
+        triggering the process of the original PV. If the signal was
+        already triggered by `trigger_group`, that status is returned."""
+        if self.pending_status is not None:
+            stat, self.pending_status = self.pending_status, None
+            return stat
         self.stat = Status(self, timeout=self.timeout)
+        if self.triggering and not self.no_mdel:
+            self.trigger_seq += 1
+            seq = self.trigger_seq
+            self.pending_triggers[seq] = (self.stat, time.time())
+            # forget the trigger if its status times out
+            self.stat.add_callback(lambda status: self.pending_triggers.pop(seq, None))
+            self.trigger_pv.put(1, use_complete=True,
+                                callback=partial(self.trigger_done, seq))
+            return self.stat
         if self.triggering:
             self.trigger_pv.put(1)
-        if self.no_mdel or not self.triggering:
-            self.stat.set_finished()
+        self.stat.set_finished()
         return self.stat
+
+    def trigger_done(self, seq, **kwargs):
+        """Put-completion callback of the trigger `seq`."""
+        entry = self.pending_triggers.pop(seq, None)
+        if entry is None:
+            return
+        status, put_time = entry
+        self.trigger_latency.add(time.time() - put_time)
+        if not status.done:
+            status.set_finished()
+
+    def read(self):
+        # a group trigger that was not followed by a trigger of this
+        # signal must not be used by a later one
+        self.pending_status = None
+        return super().read()
+
+
+def get_trigger_signals(device):
+    """The TriggerEpicsSignalRO components of kind normal of `device`."""
+    return [component for _, component in device._get_components_of_kind(Kind.normal)
+            if isinstance(component, TriggerEpicsSignalRO)]
+
+def trigger_group(signals):
+    """Triggers all `signals` at once and returns one Status, finished
+    when all of them are. All trigger-PVs are put before waiting for any
+    of them. Each signal keeps its part of the status, so the next
+    `trigger` of the single signal (e.g. by bps.trigger_and_read) does
+    not trigger it again."""
+    statuses = []
+    for signal in signals:
+        signal.pending_status = None
+        status = signal.trigger()
+        signal.pending_status = status
+        statuses.append(status)
+    if not statuses:
+        status = Status()
+        status.set_finished()
+        return status
+    return reduce(AndStatus, statuses)
+
+
+class Group_Trigger_Device(Device):
+    """A Device whose trigger triggers all its used measurement channels
+    (TriggerEpicsSignalRO) at once, see trigger_group."""
+    def trigger(self):
+        return trigger_group(get_trigger_signals(self))
+
+
+class Latency_Histogram:
+    """Histogram of latencies in seconds with `bins_per_decade`
+    logarithmic bins between `low` and `high` (plus one bin below and
+    one above)."""
+    def __init__(self, bins_per_decade=4, low=1e-4, high=1e2):
+        n_bins = int(round(bins_per_decade * math.log10(high / low)))
+        self.edges = [low * 10 ** (i / bins_per_decade) for i in range(n_bins + 1)]
+        self.counts = [0] * (n_bins + 2)
+        self.n = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, latency):
+        self.counts[bisect.bisect_right(self.edges, latency)] += 1
+        self.n += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def mean(self):
+        return self.total / self.n if self.n else None
+
+    def quantile(self, q):
+        """Upper edge of the bin containing the `q`-quantile (at most
+        the maximum)."""
+        if not self.n:
+            return None
+        count = 0
+        for i, n in enumerate(self.counts):
+            count += n
+            if count >= q * self.n and i < len(self.edges):
+                return min(self.edges[i], self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'n': self.n, 'mean': self.mean(), 'max': self.max,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95),
+                'edges': self.edges, 'counts': self.counts}
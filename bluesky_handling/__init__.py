@@ -1,3 +1,3 @@
 from .special_plan_stubs import trigger_and_read_devices
-from .TriggerEpicsSignalRO import TriggerEpicsSignalRO
-from .EpicsFieldSignal import EpicsFieldSignalRO, EpicsFieldSignal
\ No newline at end of file
+from .TriggerEpicsSignalRO import TriggerEpicsSignalRO, Group_Trigger_Device
+from .EpicsFieldSignal import EpicsFieldSignalRO, EpicsFieldSignal, Field_Group_Device
\ No newline at end of file
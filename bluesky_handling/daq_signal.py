@@ -6,6 +6,9 @@ This is a temporary script file.
 """
 
 import nidaqmx
+from nidaqmx.constants import AcquisitionType
+from nidaqmx.stream_readers import AnalogSingleChannelReader
+import numpy as np
 
 from ophyd import Device, Signal
 from ophyd.signal import SignalRO
@@ -95,7 +98,16 @@ class DAQ_Signal_Output(Signal):
         
         
 class DAQ_Signal_Input(SignalRO):
-    def __init__(self,  name, value=0., timestamp=None, parent=None, labels=None, kind='hinted', tolerance=None, rtolerance=None, metadata=None, cl=None, attr_name='', line_name='', digital=False, minV=-10, maxV=10, terminal_config='default'):
+    """Reads an analog or digital input line of a NI-DAQ.
+
+    With `n_samples` of 1, every reading is a single, software-timed
+    sample. Otherwise the task is hardware-timed with the sample clock at
+    `sample_rate` and each reading acquires `n_samples` samples with one
+    driver call into a preallocated array. Depending on
+    `buffered_output`, the reading is the "mean" (and its standard
+    deviation as "<name>_std"), the "std" or the whole "array".
+    """
+    def __init__(self,  name, value=0., timestamp=None, parent=None, labels=None, kind='hinted', tolerance=None, rtolerance=None, metadata=None, cl=None, attr_name='', line_name='', digital=False, minV=-10, maxV=10, terminal_config='default', n_samples=1, sample_rate=1000, buffered_output='mean'):
         super().__init__(name=name, value=value, timestamp=timestamp, parent=parent, labels=labels, kind=kind, tolerance=tolerance, rtolerance=rtolerance, metadata=metadata, cl=cl, attr_name=attr_name)
         self.task = nidaqmx.Task()
         tasks.append(self.task)
@@ -103,11 +115,18 @@ class DAQ_Signal_Input(SignalRO):
         self.minV = minV
         self.maxV = maxV
         self.terminal_config = terminal_config
+        self.n_samples = n_samples
+        self.sample_rate = sample_rate
+        self.buffered_output = buffered_output
+        self.buffer = None
+        self.reader = None
+        self.std = 0.
         if line_name:
             self.setup_line(line_name)
 
     def setup_line(self, line_name, digital=None, terminal_config=None, minV=None,
-                   maxV=None):
+                   maxV=None, n_samples=None, sample_rate=None,
+                   buffered_output=None):
         if minV is not None:
             self.minV = minV
         if maxV is not None:
@@ -116,6 +135,12 @@ class DAQ_Signal_Input(SignalRO):
             self.terminal_config = terminal_config
         if digital is not None:
             self.digital = digital
+        if n_samples is not None:
+            self.n_samples = int(n_samples)
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if buffered_output is not None:
+            self.buffered_output = buffered_output
         if self.digital:
             self.task.di_channels.add_di_chan(line_name)
         else:
@@ -123,19 +148,71 @@ class DAQ_Signal_Input(SignalRO):
                                                       terminal_config=get_an_config(self.terminal_config),
                                                       min_val=self.minV,
                                                       max_val=self.maxV)
+        self.setup_timing()
+
+    def setup_timing(self):
+        """Configures the sample clock and the buffer, if more than one
+        sample is taken per reading."""
+        if not self.buffered:
+            return
+        self.task.timing.cfg_samp_clk_timing(self.sample_rate,
+                                             sample_mode=AcquisitionType.FINITE,
+                                             samps_per_chan=self.n_samples)
+        self.buffer = np.zeros(self.n_samples, dtype=np.float64)
+        if not self.digital:
+            self.reader = AnalogSingleChannelReader(self.task.in_stream)
 
+    @property
+    def buffered(self):
+        return self.n_samples > 1
 
     def destroy(self):
         self.task.close()
         super().destroy()
-                        
+
     def get(self):
-        self._readback = self.task.read()
+        if self.buffered:
+            self._readback = self.read_buffered()
+        else:
+            self._readback = self.task.read()
         return super().get()
 
-    
+    def read_buffered(self):
+        """Acquires `n_samples` into the buffer (the finite task starts
+        and stops with the read) and returns the configured output."""
+        timeout = self.n_samples / self.sample_rate + 10
+        if self.reader is not None:
+            self.reader.read_many_sample(self.buffer,
+                                         number_of_samples_per_channel=self.n_samples,
+                                         timeout=timeout)
+        else:
+            self.buffer[:] = self.task.read(number_of_samples_per_channel=self.n_samples,
+                                            timeout=timeout)
+        self.std = float(np.std(self.buffer))
+        if self.buffered_output == 'array':
+            return self.buffer.copy()
+        if self.buffered_output == 'std':
+            return self.std
+        return float(np.mean(self.buffer))
 
-    
+    def read(self):
+        res = super().read()
+        if self.buffered and self.buffered_output == 'mean':
+            res[f'{self.name}_std'] = {'value': self.std,
+                                       'timestamp': res[self.name]['timestamp']}
+        return res
+
+    def describe(self):
+        desc = super().describe()
+        if not self.buffered:
+            return desc
+        if self.buffered_output == 'array':
+            desc[self.name]['dtype'] = 'array'
+            desc[self.name]['shape'] = [self.n_samples]
+        elif self.buffered_output == 'mean':
+            desc[f'{self.name}_std'] = {'source': desc[self.name]['source'],
+                                        'dtype': 'number', 'shape': []}
+        return desc
 
 
 
@@ -1,22 +1,80 @@
 from bluesky.callbacks.core import CallbackBase
 import numpy as np
+import functools
+import builtins
 import ast
 
 
-_base_namespace = {"numpy": np, "np": np}
+_base_namespace = {"numpy": np, "np": np, "__builtins__": builtins}
 _base_namespace.update({name: getattr(np, name) for name in np.__all__})
 
+expression_cache_size = 1024
+
+
+@functools.lru_cache(maxsize=expression_cache_size)
+def compile_expression(eval_str:str):
+    """Compiles `eval_str` into a code object. The results are kept in
+    a bounded LRU-cache, so each formula is only parsed once."""
+    return compile(eval_str, '<formula>', 'eval')
+
+def get_cache_info():
+    """Returns the hits, misses, maxsize and currsize of the
+    expression-cache."""
+    return compile_expression.cache_info()
+
+def clear_cache():
+    """Empties the expression-cache and resets its counters."""
+    compile_expression.cache_clear()
+
+
+class Layered_Namespace(dict):
+    """The globals for evaluating the formulas: a real dictionary, that
+    looks up missing keys in its `layers` (first one wins). eval needs
+    the namespace as globals, with a mapping as locals comprehensions
+    and lambdas inside the formulas would not see the variables.
+    Assignments (e.g. with :=) only go into the dictionary itself."""
+    def __init__(self, *layers):
+        super().__init__(__builtins__=builtins)
+        self.layers = layers
+
+    def __missing__(self, key):
+        for layer in self.layers:
+            if key in layer:
+                return layer[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key)\
+               or any(key in layer for layer in self.layers)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
 
 class Evaluator(CallbackBase):
+    """Evaluates formulas with the protocol variables and the data of
+    the latest event.
+
+    The namespace is a layered lookup: the protocol variables given as
+    `namespace` (kept as reference, so changes in the protocol are seen
+    directly), then the data of the latest event and finally the shared
+    base functions of numpy. The shared base is never written to.
+    `versions` keeps the number of the event that last changed each key
+    of the event data."""
     def __init__(self, *args, namespace=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.add_namespace = namespace or {}
-        self.namespace = _base_namespace
-        self.namespace.update(self.add_namespace)
+        self.add_namespace = namespace if namespace is not None else {}
+        self.event_data = {}
+        self.versions = {}
+        self.n_events = 0
+        self.namespace = Layered_Namespace(self.add_namespace, self.event_data,
+                                           _base_namespace)
         self.last_update = 0
 
     def eval(self, eval_str:str):
-        self.namespace.update(self.add_namespace)
         # If it is a key in our namespace, look it up.
         try:
             # This handles field or stream names that are not valid
@@ -26,20 +84,148 @@ class Evaluator(CallbackBase):
             pass
         # Check whether it is valid Python syntax.
         try:
-            ast.parse(eval_str)
+            code = compile_expression(eval_str)
         except SyntaxError as err:
             raise ValueError(f"Could not find {eval_str!r} in namespace or parse it as a Python expression.") from err
         # Try to evaluate it as a Python expression in the namespace.
         try:
-            return eval(eval_str, self.namespace)
+            return eval(code, Layered_Namespace(*self.namespace.layers))
         except Exception as err:
             raise ValueError(f"Could not find {eval_str!r} in namespace or evaluate it.") from err
 
+    def eval_page(self, eval_str:str, doc):
+        """Evaluates `eval_str` for all rows of the event_page `doc`.
+        Returns an array with one value per row.
+
+        If the formula is elementwise (only operators, comparisons and
+        numpy-ufuncs, see `get_elementwise_calls`) and only uses scalar
+        columns, it is evaluated once on numpy-arrays of the columns.
+        Everything else (e.g. np.mean(x) or np.cumsum(x), which would
+        work on the whole page instead of the single event) is evaluated
+        row by row like `eval` for single events."""
+        n_rows = len(doc['time'])
+        page_data = {'time': np.asarray(doc['time'])}
+        page_data.update({key: np.asarray(val)
+                          for key, val in doc['data'].items()})
+        namespace = Layered_Namespace(self.add_namespace, page_data,
+                                      _base_namespace)
+        if eval_str in namespace:
+            return per_row(namespace[eval_str], n_rows)
+        try:
+            code = compile_expression(eval_str)
+        except SyntaxError as err:
+            raise ValueError(f"Could not find {eval_str!r} in namespace or parse it as a Python expression.") from err
+        columns = [page_data[name] for name in get_names(code)
+                   if name in page_data and name not in self.add_namespace]
+        if all(col.ndim == 1 for col in columns)\
+                and is_elementwise(eval_str, namespace):
+            try:
+                value = eval(code, namespace)
+                if not columns:
+                    # does not depend on the rows
+                    return per_row(value, n_rows)
+                value = np.asarray(value)
+                if value.ndim == 1 and value.shape[0] == n_rows:
+                    return value
+            except Exception:
+                pass
+        values = []
+        for i in range(n_rows):
+            row = {key: val[i] for key, val in page_data.items()}
+            try:
+                values.append(eval(code, Layered_Namespace(self.add_namespace,
+                                                           row, _base_namespace)))
+            except Exception as err:
+                raise ValueError(f"Could not find {eval_str!r} in namespace or evaluate it.") from err
+        return np.asarray(values)
+
     def event(self, doc):
-        self.namespace['time'] = doc['time']
-        self.namespace.update(doc['data'])
-        self.namespace.update(self.add_namespace)
+        self.n_events += 1
+        self.update_event_data('time', doc['time'])
+        for key, val in doc['data'].items():
+            self.update_event_data(key, val)
         self.last_update = doc['time']
 
+    def event_page(self, doc):
+        """Puts the last row of the page into the event-layer, so that
+        `eval` behaves as if the single events were received."""
+        self.n_events += 1
+        self.update_event_data('time', doc['time'][-1])
+        for key, val in doc['data'].items():
+            self.update_event_data(key, val[-1])
+        self.last_update = doc['time'][-1]
+
+    def update_event_data(self, key, val):
+        """Only writes `val` to the event-layer if it changed."""
+        if key in self.event_data and self.event_data[key] is val:
+            return
+        self.event_data[key] = val
+        self.versions[key] = self.n_events
+
     def is_to_date(self, t):
-        return self.last_update == t
\ No newline at end of file
+        return self.last_update == t
+
+
+@functools.lru_cache(maxsize=expression_cache_size)
+def get_names(code):
+    """All names used by the code object `code`, including those of
+    nested comprehensions and lambdas."""
+    names = set(code.co_names) | set(code.co_varnames)
+    for const in code.co_consts:
+        if hasattr(const, 'co_names'):
+            names |= get_names(const)
+    return frozenset(names)
+
+def per_row(value, n_rows):
+    """Makes sure `value` has one entry per row, repeating values that
+    do not depend on the rows (e.g. protocol variables)."""
+    value = np.asarray(value)
+    if value.ndim and value.shape[0] == n_rows:
+        return value
+    return np.repeat(value[np.newaxis], n_rows, axis=0)
+
+_elementwise_nodes = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare,
+                      ast.Call, ast.Attribute, ast.Name, ast.Constant,
+                      ast.Load, ast.operator, ast.unaryop, ast.cmpop)
+
+@functools.lru_cache(maxsize=expression_cache_size)
+def get_elementwise_calls(eval_str:str):
+    """If `eval_str` only consists of names, constants, operators,
+    comparisons and calls of (dotted) names, returns the names of the
+    called functions, otherwise None."""
+    calls = []
+    for node in ast.walk(ast.parse(eval_str, mode='eval')):
+        if not isinstance(node, _elementwise_nodes):
+            return None
+        if isinstance(node, ast.Call):
+            name = get_dotted_name(node.func)
+            if name is None or node.keywords:
+                return None
+            calls.append(name)
+    return tuple(calls)
+
+def get_dotted_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        name = get_dotted_name(node.value)
+        return name and f'{name}.{node.attr}'
+    return None
+
+def is_elementwise(eval_str, namespace):
+    """Whether `eval_str` works elementwise on arrays, i.e. it is made
+    of operators and all called functions are numpy-ufuncs."""
+    calls = get_elementwise_calls(eval_str)
+    if calls is None:
+        return False
+    for name in calls:
+        first, *attrs = name.split('.')
+        try:
+            func = namespace[first]
+            for attr in attrs:
+                func = getattr(func, attr)
+        except (KeyError, AttributeError):
+            return False
+        if not isinstance(func, np.ufunc):
+            return False
+    return True
@@ -0,0 +1,117 @@
+import os
+import time
+
+import h5py
+from bluesky.callbacks.core import CallbackBase
+from event_model import pack_event_page
+
+from utility.databroker_export import recourse_entry_dict, Stream_Writer
+
+
+class HDF5_Writer(CallbackBase):
+    """Writes the runs into an HDF5 file while they are measured.
+
+    The layout is the same as the one of
+    `utility.databroker_export.broker_to_hdf5`: one group per run (named
+    by its uid) with a group per stream, containing a dataset per
+    data-key and "time", and the start- and stop-documents as
+    "start" and "stop". The datasets are resizable and chunked, the
+    events are collected and appended every `flush_interval` seconds (or
+    if `max_buffered` rows are waiting), then the file is flushed. So at
+    most the last seconds are lost if the measurement crashes.
+
+    Parameters
+    ----------
+    filename : str, path
+        The HDF5 file, it is created if it does not exist.
+    flush_interval : float, default 1
+        Time in seconds between writes into the file.
+    max_buffered : int, default 1000
+        Number of buffered rows per stream that also trigger a write.
+    additional_data : dict, default None
+        Written into each run's group, like in `broker_to_hdf5`.
+    compression : str, default None
+        Compression of the datasets ("gzip" or "lzf"), see h5py.
+    compression_opts : int, default None
+        The level for gzip-compression.
+    """
+    def __init__(self, filename, flush_interval=1, max_buffered=1000,
+                 additional_data=None, compression=None,
+                 compression_opts=None):
+        super().__init__()
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.additional_data = additional_data or {}
+        self.file = None
+        self.entry = None
+        self.streams = {}
+        self.descriptors = {}
+        self.last_flush = 0
+
+    def start(self, doc):
+        self.open_file()
+        self.entry = self.file.create_group(doc['uid'])
+        self.write_metadata({'start': dict(doc)})
+        self.file.flush()
+
+    def open_file(self):
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.file = h5py.File(self.filename, 'a')
+        self.streams = {}
+        self.descriptors = {}
+        self.last_flush = time.time()
+
+    def descriptor(self, doc):
+        name = doc.get('name', 'primary')
+        if name not in self.streams:
+            self.streams[name] = Stream_Writer(self.entry.create_group(name),
+                                               compression=self.compression,
+                                               compression_opts=self.compression_opts)
+        self.streams[name].add_data_keys(doc['data_keys'], skip_external=True)
+        self.descriptors[doc['uid']] = self.streams[name]
+
+    def event(self, doc):
+        self.event_page(pack_event_page(doc))
+
+    def event_page(self, doc):
+        stream = self.descriptors[doc['descriptor']]
+        stream.buffer_page(doc)
+        if (stream.n_buffered >= self.max_buffered
+                or time.time() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Writes all buffered events into the file."""
+        if self.file is None:
+            return
+        for stream in self.streams.values():
+            stream.write()
+        self.file.flush()
+        self.last_flush = time.time()
+
+    def stop(self, doc):
+        if self.file is None:
+            return
+        self.flush()
+        self.write_metadata({'stop': dict(doc)})
+        self.write_metadata(self.additional_data)
+        self.close()
+
+    def write_metadata(self, metadata):
+        """Writes `metadata` like broker_to_hdf5, but an entry that
+        cannot be written does not stop the measurement."""
+        try:
+            recourse_entry_dict(self.entry, metadata)
+        except (TypeError, ValueError) as e:
+            print(f'HDF5_Writer: could not write all metadata: {e}')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.entry = None
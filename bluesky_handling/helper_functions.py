@@ -1,17 +1,59 @@
 import numpy as np
 from bluesky import plan_stubs as bps
 
+from .special_plan_stubs import trigger_and_read_channels
+
+# called with the name of each starting loop_step, e.g. by the
+# protocol_runner to report the progress
+step_callbacks = []
+
+
+def report_step(name):
+    """Reports the start of the loop_step `name` to the step_callbacks,
+    if there are none, it is printed."""
+    if not step_callbacks:
+        print(f'starting loop_step {name}')
+    for callback in step_callbacks:
+        callback(name)
+
+def get_trigger_latencies(devs):
+    """Returns the trigger-latency histograms (see TriggerEpicsSignalRO)
+    of all triggered signals of the devices in `devs` by PV-name."""
+    latencies = {}
+    for dev in devs.values():
+        signals = [dev]
+        if hasattr(dev, 'walk_signals'):
+            signals = [walk.item for walk in dev.walk_signals()]
+        for signal in signals:
+            histogram = getattr(signal, 'trigger_latency', None)
+            if histogram is not None and histogram.n:
+                latencies[signal.pvname] = histogram
+    return latencies
+
+def report_trigger_latencies(devs):
+    """Prints the number, mean, median, 95th percentile and maximum of
+    the trigger latencies of each PV, the slowest first."""
+    latencies = get_trigger_latencies(devs)
+    if not latencies:
+        return
+    print('trigger latencies (s):  n  mean  p50  p95  max')
+    for pv, hist in sorted(latencies.items(), key=lambda x: -x[1].mean()):
+        print(f'{pv}:  {hist.n}  {hist.mean():.3g}  {hist.quantile(0.5):.3g}  '
+              f'{hist.quantile(0.95):.3g}  {hist.max:.3g}')
+
 
 def get_fit_results(fits, namespace, yielding=False, stream='primary',
                     clearing=False, plots=None):
     for name, fit in fits.items():
+        fit.wait_for_fit()
         if not fit.result:
             continue
-        for param in fit.params:
-            namespace[f'{name}_{param}'] = fit.result.best_values[param]
+        values = fit.result_values()
+        for param in fit.model.param_names:
+            namespace[f'{name}_{param}'] = values[param]
         namespace[f'{name}_covar'] = fit.result.covar
         if yielding and fit.stream_name == stream:
-            yield from bps.trigger_and_read(fit.ophyd_fit.used_comps,
+            yield from bps.trigger_and_read([fit.ophyd_fit],
                                             name=f'{stream}_fits')
             fit._reset()
     if clearing and plots:
@@ -29,7 +71,7 @@ def gradient_descent(max_iterations, threshold, w_init, func_text, evaluator,
         yield from bps.checkpoint()
         yield from bps.abs_set(set_channel, set_val, group='A')
         yield from bps.wait('A')
-        yield from bps.trigger_and_read(read_channels, name=stream_name)
+        yield from trigger_and_read_channels(read_channels, name=stream_name)
         # yield from bps.sleep(1)
 
     if max_step_for_diff is None:
@@ -5,6 +5,7 @@ import databroker
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from utility import load_save_functions
+from bluesky_handling import run_index
 
 def make_yml(datapath, catalog_name='CAMELS_CATALOG'):
     catalog_path = databroker.catalog_search_path()[0]
@@ -21,6 +22,9 @@ def make_yml(datapath, catalog_name='CAMELS_CATALOG'):
                 f'        - "{brokerpath}/*.msgpack"')
     if not os.path.isdir(brokerpath):
         os.makedirs(brokerpath)
+    index = run_index.Run_Index(f'{brokerpath}/{run_index.index_filename}')
+    index.update_from_files(brokerpath)
+    index.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,174 @@
+import re
+
+import h5py
+
+from bluesky_handling.hdf5_writer import HDF5_Writer
+from utility.databroker_export import recourse_entry_dict, Stream_Writer, timestamp_to_ISO8601
+
+nexus_component = re.compile(r'^([A-Za-z_]\w*)\[([A-Za-z_]\w*)\]$')
+
+standard_nexus_dict = {'/ENTRY[entry]/operator/address': 'metadata_start/user/Address (affiliation)',
+                       '/ENTRY[entry]/operator/affiliation': 'metadata_start/user/Affiliation',
+                       '/ENTRY[entry]/operator/email': 'metadata_start/user/E-Mail',
+                       '/ENTRY[entry]/operator/name': 'metadata_start/user/Name',
+                       '/ENTRY[entry]/operator/orcid': 'metadata_start/user/ORCID',
+                       '/ENTRY[entry]/operator/telephone_number': 'metadata_start/user/Phone',
+                       '/ENTRY[entry]/start_time': 'metadata_start/time',
+                       '/ENTRY[entry]/SAMPLE[sample]/data_identifier': 'metadata_start/sample/Identifier',
+                       '/ENTRY[entry]/SAMPLE[sample]/sample_name': 'metadata_start/sample/Name',
+                       '/ENTRY[entry]/SAMPLE[sample]/sample_history': 'metadata_start/sample/Preparation-Info',
+                       "/ENTRY[entry]/PROCESS[process]/program": 'metadata_start/program',
+                       "/ENTRY[entry]/PROCESS[process]/version": 'metadata_start/version',
+                       "/ENTRY[entry]/SAMPLE[sample]/measured_data": 'data'}
+
+
+def parse_nexus_path(path):
+    """Splits a NeXus-path like "/ENTRY[entry]/SAMPLE[sample]/name" into
+    a list of (name, NX_class) pairs, NX_class is None if the component
+    does not give one (e.g. "operator" or the name of the field)."""
+    components = []
+    for part in path.strip('/').split('/'):
+        match = nexus_component.match(part)
+        if match:
+            components.append((match.group(2), f'NX{match.group(1).lower()}'))
+        else:
+            components.append((part, None))
+    return components
+
+def get_from_path(doc, path):
+    """Returns the value in the (nested) dictionary `doc` at `path`
+    (keys separated by "/"), None if it does not exist."""
+    val = doc
+    for key in path.split('/'):
+        if not isinstance(val, dict) or key not in val:
+            return None
+        val = val[key]
+    return val
+
+
+class NeXus_Writer(HDF5_Writer):
+    """Writes the runs into a NeXus-file while they are measured,
+    following the `nexus_mapper` (see
+    Measurement_Protocol.get_nexus_paths and
+    protocol_builder.standard_nexus_dict).
+
+    The mapper gives for each NeXus-path the source of its value:
+    "metadata_start/..." and "metadata_stop/..." are written once from
+    the start- and stop-document, "data" is the group containing all
+    streams and "data/<channel>" links to the channel's dataset. The
+    streams are written incrementally like by HDF5_Writer, if "data" is
+    not mapped, they are put into "/entry/data". Each further run of
+    the file gets its own entry ("entry_2", ...).
+
+    Parameters
+    ----------
+    filename : str, path
+        The NeXus file, it is created if it does not exist.
+    nexus_mapper : dict
+        NeXus-path -> source of the value.
+    **kwargs
+        See HDF5_Writer.
+    """
+    def __init__(self, filename, nexus_mapper, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.nexus_mapper = nexus_mapper
+        self.entry_name = 'entry'
+        self.data_group = None
+        self.links = {}
+
+    def start(self, doc):
+        self.open_file()
+        self.entry_name = 'entry'
+        n = 1
+        while self.entry_name in self.file:
+            n += 1
+            self.entry_name = f'entry_{n}'
+        self.links = {}
+        data_path = '/ENTRY[entry]/data'
+        for path, source in self.nexus_mapper.items():
+            if source == 'data':
+                data_path = path
+            elif source.startswith('data/'):
+                self.links[source[5:]] = path
+        self.entry = self.require_group([(self.entry_name, 'NXentry')])
+        self.data_group = self.require_group(parse_nexus_path(data_path),
+                                             'NXdata')
+        self.write_mapped('metadata_start', doc)
+        self.file.flush()
+
+    def descriptor(self, doc):
+        name = doc.get('name', 'primary')
+        if name not in self.streams:
+            group = self.data_group.create_group(name)
+            group.attrs['NX_class'] = 'NXdata'
+            self.streams[name] = Stream_Writer(group,
+                                               compression=self.compression,
+                                               compression_opts=self.compression_opts)
+        stream = self.streams[name]
+        stream.add_data_keys(doc['data_keys'], skip_external=True)
+        self.descriptors[doc['uid']] = stream
+        for key in doc['data_keys']:
+            if key in self.links and key not in stream.skipped:
+                path = self.links.pop(key)
+                self.link(parse_nexus_path(path), f'{stream.group.name}/{key}')
+
+    def stop(self, doc):
+        if self.file is None:
+            return
+        self.flush()
+        self.write_mapped('metadata_stop', doc)
+        for key, path in self.links.items():
+            print(f'NeXus_Writer: channel {key} for {path} was not measured')
+        self.write_metadata(self.additional_data)
+        self.close()
+
+    def close(self):
+        super().close()
+        self.data_group = None
+
+    def write_mapped(self, source_name, doc):
+        """Writes all values of the mapper coming from `source_name`
+        ("metadata_start" or "metadata_stop") out of `doc`."""
+        doc = dict(doc)
+        for path, source in self.nexus_mapper.items():
+            if not source.startswith(f'{source_name}/'):
+                continue
+            key = source[len(source_name) + 1:]
+            val = get_from_path(doc, key)
+            if val is None:
+                continue
+            if key == 'time':
+                val = timestamp_to_ISO8601(val)
+            components = parse_nexus_path(path)
+            try:
+                group = self.require_group(components[:-1])
+                name = components[-1][0]
+                if name in group:
+                    del group[name]
+                if isinstance(val, dict):
+                    recourse_entry_dict(group.create_group(name), val)
+                else:
+                    group[name] = val
+            except (TypeError, ValueError) as e:
+                print(f'NeXus_Writer: could not write {path}: {e}')
+
+    def require_group(self, components, nx_class=None):
+        """Returns the group given by the parsed NeXus-path `components`,
+        creating it and setting the NX_class attributes if necessary."""
+        group = self.file
+        for i, (name, component_class) in enumerate(components):
+            if component_class == 'NXentry':
+                name = self.entry_name
+            if i == len(components) - 1:
+                component_class = component_class or nx_class
+            group = group.require_group(name)
+            if component_class and 'NX_class' not in group.attrs:
+                group.attrs['NX_class'] = component_class
+        return group
+
+    def link(self, components, target):
+        group = self.require_group(components[:-1])
+        name = components[-1][0]
+        if name in group:
+            del group[name]
+        group[name] = h5py.SoftLink(target)
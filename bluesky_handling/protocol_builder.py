@@ -1,11 +1,29 @@
 import os.path
 import subprocess
 import copy
+import hashlib
+import inspect
+import json
+import functools
+import sys
+import py_compile
+import importlib.util
 
 from main_classes.protocol_class import Measurement_Protocol
+from main_classes import loop_step
+from loop_steps.for_while_loops import clear_iteration_cache
 from utility import variables_handling
+from utility.load_save_functions import get_save_str
 
 from bluesky_handling.builder_helper_functions import plot_creator
+from bluesky_handling.nexus_writer import standard_nexus_dict
+
+camels_version = '0.1'
+# part of the build hash. The sources generating the code are hashed as
+# well (see get_builder_source_hash), so only increase it if the
+# generated code changes for another reason (e.g. a changed dependency).
+build_format = 5
+hash_line_start = '# CAMELS protocol build hash: '
 
 standard_string = 'import numpy as np\n'
 standard_string += 'import importlib\n'
@@ -22,6 +40,10 @@ standard_string += 'from CAMELS.main_classes import plot_widget\n'
 standard_string += 'from CAMELS.utility.databroker_export import broker_to_hdf5, broker_to_dict\n'
 standard_string += 'from CAMELS.bluesky_handling.evaluation_helper import Evaluator\n'
 standard_string += 'from CAMELS.bluesky_handling import helper_functions\n'
+standard_string += 'from CAMELS.bluesky_handling.special_plan_stubs import trigger_and_read_channels\n'
+standard_string += 'from CAMELS.bluesky_handling.hdf5_writer import HDF5_Writer\n'
+standard_string += 'from CAMELS.bluesky_handling.nexus_writer import NeXus_Writer\n'
+standard_string += 'from CAMELS.bluesky_handling import run_index\n'
 standard_string += 'RE = RunEngine()\n'
 
 # standard_run_string = '\n\neva = Evaluator(namespace=namespace)\n\n\n'
@@ -32,26 +54,93 @@ standard_run_string += '\tRE.subscribe(bec)\n'
 standard_start_string = '\n\n\nif __name__ == "__main__":\n'
 standard_start_string += '\tmain()\n'
 
-standard_nexus_dict = {'/ENTRY[entry]/operator/address': 'metadata_start/user/Address (affiliation)',
-                       '/ENTRY[entry]/operator/affiliation': 'metadata_start/user/Affiliation',
-                       '/ENTRY[entry]/operator/email': 'metadata_start/user/E-Mail',
-                       '/ENTRY[entry]/operator/name': 'metadata_start/user/Name',
-                       '/ENTRY[entry]/operator/orcid': 'metadata_start/user/ORCID',
-                       '/ENTRY[entry]/operator/telephone_number': 'metadata_start/user/Phone',
-                       '/ENTRY[entry]/start_time': 'metadata_start/time',
-                       '/ENTRY[entry]/SAMPLE[sample]/data_identifier': 'metadata_start/sample/Identifier',
-                       '/ENTRY[entry]/SAMPLE[sample]/sample_name': 'metadata_start/sample/Name',
-                       '/ENTRY[entry]/SAMPLE[sample]/sample_history': 'metadata_start/sample/Preparation-Info',
-                       "/ENTRY[entry]/PROCESS[process]/program": 'metadata_start/program',
-                       "/ENTRY[entry]/PROCESS[process]/version": 'metadata_start/version',
-                       "/ENTRY[entry]/SAMPLE[sample]/measured_data": 'data'}
 
+def get_protocol_hash(protocol:Measurement_Protocol, file_path,
+                      save_path='test.h5', catalog='CAMELS_CATALOG',
+                      userdata=None, sampledata=None):
+    """Returns a stable sha256-hash over everything that goes into the
+    python file of `protocol` (its save-dictionary, the used devices'
+    configurations, the variables, the paths, the CAMELS version and the
+    sources of the code generating it, see `get_builder_source_hash`).
+    The arguments are the same as for `build_protocol`."""
+    devices = {}
+    classes = [type(step) for step in protocol.loop_step_dict.values()]
+    for dev in protocol.get_used_devices():
+        device = variables_handling.devices[dev]
+        classes.append(type(device))
+        devices[dev] = {'name': device.name,
+                        'class': device.ophyd_class_name,
+                        'config': device.get_config(),
+                        'settings': device.get_settings(),
+                        'ioc_settings': device.get_ioc_settings(),
+                        'additional': device.get_additional_string(),
+                        'finalize': device.get_finalize_steps()}
+    content = {'protocol': get_save_str(protocol),
+               'devices': devices,
+               'protocol_variables': variables_handling.protocol_variables,
+               'loop_step_variables': variables_handling.loop_step_variables,
+               'preset': variables_handling.preset,
+               'CAMELS_path': variables_handling.CAMELS_path,
+               'device_driver_path': variables_handling.device_driver_path,
+               'file_path': file_path, 'save_path': save_path,
+               'catalog': catalog, 'userdata': userdata,
+               'sampledata': sampledata, 'version': camels_version,
+               'build_format': build_format,
+               'sources': get_builder_source_hash(classes)}
+    content = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def get_builder_source_hash(classes=()):
+    """Returns a sha256-hash over the sources of the protocol builder,
+    the protocol and loop step base classes and the modules defining
+    `classes` (the used loop steps and devices, whose
+    get_protocol_string etc. generate the code)."""
+    modules = [sys.modules[__name__], sys.modules[plot_creator.__module__],
+               sys.modules[Measurement_Protocol.__module__], loop_step]
+    modules += [sys.modules.get(cls.__module__) for cls in classes]
+    files = set()
+    for module in modules:
+        try:
+            files.add(os.path.abspath(inspect.getsourcefile(module)))
+        except TypeError:
+            continue
+    hashes = []
+    for fname in sorted(files):
+        try:
+            hashes.append(get_file_hash(fname, os.path.getmtime(fname)))
+        except OSError:
+            continue
+    return hashlib.sha256(''.join(hashes).encode()).hexdigest()
+
+@functools.lru_cache(maxsize=256)
+def get_file_hash(fname, mtime):
+    """sha256 of the file's content, cached by its modification time."""
+    with open(fname, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def read_build_hash(file_path):
+    """Returns the hash written in the first line of an already built
+    protocol file, None if there is no (readable) one."""
+    try:
+        with open(file_path, 'r') as file:
+            line = file.readline().strip()
+    except OSError:
+        return None
+    if line.startswith(hash_line_start):
+        return line[len(hash_line_start):]
+    return None
 
 def build_protocol(protocol:Measurement_Protocol, file_path,
                    save_path='test.h5', catalog='CAMELS_CATALOG', userdata=None,
-                   sampledata=None):
+                   sampledata=None, force=False):
     """Creating the python file from a given `protocol`.
 
+    The file starts with the hash of its content (see
+    `get_protocol_hash`). If the existing file has the same hash, it is
+    neither generated nor written again. The compiled bytecode is kept
+    in the __pycache__ next to the file, it is only compiled again if
+    it is missing or older than the file.
+
     Parameters
     ----------
     protocol : Measurement_Protocol
@@ -66,7 +155,21 @@ def build_protocol(protocol:Measurement_Protocol, file_path,
         Should contain information about the user
     sampledata : dict, default None
         Should contain information about the sample
+    force : bool, default False
+        If True, the file is generated even if it is up to date
+
+    Returns
+    -------
+    built : bool
+        False if the existing file was up to date and thus kept
     """
+    clear_iteration_cache()
+    build_hash = get_protocol_hash(protocol, file_path, save_path, catalog,
+                                   userdata, sampledata)
+    if not force and read_build_hash(file_path) == build_hash:
+        if not is_compiled(file_path):
+            compile_protocol(file_path)
+        return False
     device_import_string = '\n'
     devices_string = '\n\t\tdevs = {}\n\t\tdevice_config = {}\n'
     variable_string = '\nnamespace = {}\n'
@@ -120,8 +223,9 @@ def build_protocol(protocol:Measurement_Protocol, file_path,
         final_string += device.get_finalize_steps()
     devices_string += '\t\tprint("devices connected")\n'
     devices_string += '\t\tmd = {"device_config": device_config}\n'
-    devices_string += '\t\tmd.update({"program": "CAMELS", "version": "0.1"})\n'
+    devices_string += f'\t\tmd.update({{"program": "CAMELS", "version": "{camels_version}"}})\n'
     devices_string += '\t\tmd["variables"] = namespace\n'
+    devices_string += f'\t\tmd["protocol"] = "{protocol.name}"\n'
     if protocol.use_nexus:
         md_dict = {}
         for i, name in enumerate(protocol.metadata['Name']):
@@ -130,7 +234,8 @@ def build_protocol(protocol:Measurement_Protocol, file_path,
     plot_string, plotting = plot_creator(protocol.plots)
     # for device in protocol.get_used_devices():
     #     print(device)
-    protocol_string = 'import sys\n'
+    protocol_string = f'{hash_line_start}{build_hash}\n'
+    protocol_string += 'import sys\n'
     protocol_string += f'sys.path.append(r"{os.path.dirname(variables_handling.CAMELS_path)}")\n'
     protocol_string += f'sys.path.append("{variables_handling.device_driver_path}")\n\n'
     protocol_string += standard_string
@@ -143,6 +248,17 @@ def build_protocol(protocol:Measurement_Protocol, file_path,
     protocol_string += standard_run_string
     protocol_string += f'\tcatalog = databroker.catalog["{catalog}"]\n'
     protocol_string += '\tRE.subscribe(catalog.v1.insert)\n'
+    protocol_string += f'\trun_indexer = run_index.make_indexer("{catalog}")\n'
+    protocol_string += '\tif run_indexer is not None:\n'
+    protocol_string += '\t\tRE.subscribe(run_indexer)\n'
+    if protocol.use_nexus:
+        nexus_dict = protocol.get_nexus_paths()
+        nexus_dict.update(standard_nexus_dict)
+        protocol_string += f'\tnexus_mapper = {nexus_dict}\n'
+        protocol_string += f'\thdf5_writer = NeXus_Writer("{save_path}", nexus_mapper)\n'
+    else:
+        protocol_string += f'\thdf5_writer = HDF5_Writer("{save_path}")\n'
+    protocol_string += '\tRE.subscribe(hdf5_writer)\n'
     protocol_string += '\ttry:\n'
     # protocol_string += '\tRE.subscribe(eva)\n\n'
     protocol_string += devices_string
@@ -152,18 +268,15 @@ def build_protocol(protocol:Measurement_Protocol, file_path,
     protocol_string += user_sample_string(userdata, sampledata)
     protocol_string += '\t\tadditional_step_data = steps_add_main(RE)\n'
     protocol_string += f'\t\tuids = RE({protocol.name}_plan(devs, md=md, runEngine=RE))\n'
+    protocol_string += '\t\thelper_functions.report_trigger_latencies(devs)\n'
     protocol_string += '\tfinally:\n'
-    protocol_string += final_string or '\t\tpass\n'
+    # a pause also leaves RE(...), the run is continued by RE.resume()
+    protocol_string += '\t\tif RE.state != "paused":\n'
+    for line in final_string.splitlines():
+        protocol_string += f'\t{line}\n'
+    protocol_string += '\t\t\thdf5_writer.close()\n'
 
-    standard_save_string = '\n\n\truns = catalog[uids]\n'
-    if protocol.use_nexus:
-        nexus_dict = protocol.get_nexus_paths()
-        nexus_dict.update(standard_nexus_dict)
-        standard_save_string += '\tdata = broker_to_dict(runs)\n'
-        standard_save_string += f'\tnexus_mapper = {nexus_dict}\n'
-        # TODO finish this
-    else:
-        standard_save_string += f'\tbroker_to_hdf5(runs, "{save_path}")\n\n\n'
+    standard_save_string = '\n\n'
     standard_save_string += '\tapp = QCoreApplication.instance()\n'
     standard_save_string += '\tprint("protocol finished!")\n'
     standard_save_string += '\tif app is not None:\n'
@@ -176,6 +289,28 @@ def build_protocol(protocol:Measurement_Protocol, file_path,
         os.makedirs(os.path.dirname(file_path))
     with open(file_path, 'w+') as file:
         file.write(protocol_string)
+    compile_protocol(file_path)
+    return True
+
+def compile_protocol(file_path):
+    """Writes the bytecode of the protocol file to its __pycache__. The
+    .pyc is always rewritten, so only call it after (re)building the
+    file."""
+    try:
+        cfile = py_compile.compile(file_path, doraise=True)
+    except (py_compile.PyCompileError, OSError) as e:
+        print(f'Could not compile {file_path}: {e}')
+        return None
+    return cfile
+
+def is_compiled(file_path):
+    """Whether the .pyc of `file_path` exists and is not older than the
+    file itself."""
+    cfile = importlib.util.cache_from_source(os.path.abspath(file_path))
+    try:
+        return os.path.getmtime(cfile) >= os.path.getmtime(file_path)
+    except OSError:
+        return False
 
 def user_sample_string(userdata, sampledata):
     """Returns the string adding userdata and sampledata to the md."""
@@ -0,0 +1,339 @@
+"""The process in which the protocols are run.
+
+It is started by utility.qthreads.Run_Protocol and talks to it through
+length-prefixed msgpack messages: commands come in via stdin, progress,
+status and the output of the protocol go out via stdout. Everything
+the protocol prints is sent as "log" message.
+
+Messages to the runner (all dicts with the key "type"):
+    run      : "path" of the protocol file, its "name"
+    pause    : requests a pause of the RunEngine
+    resume   : resumes the paused RunEngine
+    abort    : aborts the RunEngine and exits the runner
+    exec     : executes the python "code" in the runner's namespace
+    preload  : imports the "modules" (e.g. the devices' ophyd-classes),
+               adding "paths" to sys.path
+    exit     : exits the runner
+
+Each runner only runs one protocol, afterwards it keeps running until
+all plot-windows are closed, while a fresh runner is already waiting
+for the next protocol.
+
+Messages from the runner:
+    ready    : the standard imports are done ("import_time"), protocols
+               can be run
+    step     : the loop_step "name" starts
+    first_event : the run emitted its first event (the documents
+               themselves are not sent, the plots live in the runner)
+    log      : "text" printed by the protocol
+    paused   : the RunEngine is paused
+    finished : the protocol "name" finished, "aborted" or not
+    error    : the protocol failed, "text" is the traceback
+"""
+
+import os
+import sys
+import struct
+import importlib.util
+import threading
+import traceback
+import time
+
+import numpy as np
+import msgpack
+
+
+header = struct.Struct('>I')
+
+# imported when the runner starts, these are the modules used by every
+# protocol (see protocol_builder.standard_string)
+preloaded_modules = ['bluesky', 'bluesky.plan_stubs',
+                     'bluesky.callbacks.best_effort', 'databroker', 'epics',
+                     'ophyd', 'matplotlib.pyplot',
+                     'CAMELS.main_classes.plot_widget',
+                     'CAMELS.utility.databroker_export',
+                     'CAMELS.bluesky_handling.evaluation_helper',
+                     'CAMELS.bluesky_handling.helper_functions',
+                     'CAMELS.bluesky_handling.run_index']
+
+
+def pack_default(obj):
+    """Makes numpy-values (and other unknown objects) packable."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+def write_message(stream, msg):
+    """Writes `msg` to the binary `stream`, prefixed by its length."""
+    data = msgpack.packb(msg, default=pack_default, use_bin_type=True)
+    stream.write(header.pack(len(data)) + data)
+    stream.flush()
+
+def read_exactly(stream, n):
+    data = b''
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def read_message(stream):
+    """Reads the next message from the binary `stream`. Returns None if
+    the stream is closed."""
+    head = read_exactly(stream, header.size)
+    if head is None:
+        return None
+    data = read_exactly(stream, header.unpack(head)[0])
+    if data is None:
+        return None
+    return msgpack.unpackb(data, raw=False)
+
+
+class Message_Channel:
+    """Thread-safe writing of messages to the parent process."""
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def send(self, msg_type, **kwargs):
+        kwargs['type'] = msg_type
+        with self.lock:
+            try:
+                write_message(self.stream, kwargs)
+            except (OSError, ValueError):
+                pass
+
+
+class Log_Writer:
+    """Replaces sys.stdout / sys.stderr, sending complete lines as
+    "log" messages."""
+    def __init__(self, channel):
+        self.channel = channel
+        self.buffer = ''
+
+    def write(self, text):
+        self.buffer += text
+        if '\n' in self.buffer:
+            lines, self.buffer = self.buffer.rsplit('\n', 1)
+            self.channel.send('log', text=lines)
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            self.channel.send('log', text=self.buffer)
+            self.buffer = ''
+
+    def isatty(self):
+        return False
+
+
+class Protocol_Runner:
+    """Runs the protocols in the main thread of the process (which
+    also runs the Qt event loop for the plots), while the commands are
+    read in a separate thread."""
+    def __init__(self, channel, command_stream):
+        from PyQt5.QtCore import QObject, pyqtSignal
+
+        class Command_Relay(QObject):
+            command = pyqtSignal(dict)
+
+        self.channel = channel
+        self.command_stream = command_stream
+        self.relay = Command_Relay()
+        self.relay.command.connect(self.handle_command)
+        self.namespace = {'__name__': '__camels_runner__'}
+        self.module = None
+        self.name = None
+        self.running = False
+        self.paused = False
+        self.abort_requested = False
+        self.first_event_sent = False
+
+    @property
+    def run_engine(self):
+        return getattr(self.module, 'RE', None)
+
+    def read_commands(self):
+        """Reads the commands from the parent. pause is handled right
+        away, since the main thread is busy with the RunEngine, the
+        others are passed to the main thread."""
+        while True:
+            msg = read_message(self.command_stream)
+            if msg is None:
+                msg = {'type': 'exit'}
+            if msg['type'] in ('pause', 'abort'):
+                self.pause()
+            if msg['type'] != 'pause':
+                try:
+                    self.relay.command.emit(msg)
+                except RuntimeError:
+                    # the runner already exited
+                    return
+            if msg['type'] in ('exit', 'abort'):
+                return
+
+    def handle_command(self, msg):
+        msg_type = msg['type']
+        if msg_type == 'run':
+            self.run_protocol(msg['path'], msg['name'])
+        elif msg_type == 'resume':
+            self.resume()
+        elif msg_type == 'abort':
+            self.abort()
+        elif msg_type == 'exec':
+            self.execute(msg['code'])
+        elif msg_type == 'preload':
+            preload(msg['modules'], msg.get('paths', []))
+        elif msg_type == 'exit':
+            self.exit()
+
+    def send_first_event(self, name, doc):
+        if self.first_event_sent:
+            return
+        self.first_event_sent = True
+        self.channel.send('first_event')
+
+    def send_step(self, name):
+        self.channel.send('step', name=name)
+
+    def run_protocol(self, path, name):
+        """Imports the protocol from `path` and runs its main."""
+        try:
+            spec = importlib.util.spec_from_file_location(name, path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[spec.name] = module
+            spec.loader.exec_module(module)
+        except Exception:
+            self.channel.send('error', text=traceback.format_exc())
+            self.channel.send('finished', name=name, aborted=True)
+            return
+        self.module = module
+        self.name = name
+        self.namespace[f'{name}_mod'] = module
+        module.RE.subscribe(self.send_first_event, 'event')
+        self.call_protocol(module.main)
+
+    def call_protocol(self, function):
+        """Calls `function` (main or RE.resume), sending the messages
+        depending on how it ends."""
+        from bluesky.utils import RunEngineInterrupted
+        self.running = True
+        aborted = False
+        try:
+            self.namespace[f'dat_{self.name}'] = function()
+        except RunEngineInterrupted:
+            if self.abort_requested:
+                self.running = False
+                self.abort()
+                return
+            if self.run_engine is not None and self.run_engine.state == 'paused':
+                self.paused = True
+                self.channel.send('paused')
+                return
+            aborted = True
+        except SystemExit:
+            pass
+        except Exception:
+            self.channel.send('error', text=traceback.format_exc())
+            aborted = True
+        finally:
+            self.running = False
+            sys.stdout.flush()
+        self.paused = False
+        self.channel.send('finished', name=self.name, aborted=aborted)
+        self.retire()
+
+    def pause(self):
+        run_engine = self.run_engine
+        if self.running and run_engine is not None:
+            run_engine.request_pause(defer=False)
+
+    def resume(self):
+        if self.paused:
+            self.call_protocol(self.run_engine.resume)
+
+    def abort(self):
+        """Aborts the RunEngine and exits. If the protocol is still
+        running, this is done as soon as the RunEngine paused."""
+        if self.running:
+            self.abort_requested = True
+            return
+        run_engine = self.run_engine
+        if run_engine is not None and run_engine.state != 'idle':
+            try:
+                run_engine.abort()
+            except Exception:
+                self.channel.send('error', text=traceback.format_exc())
+        self.paused = False
+        self.channel.send('finished', name=self.name, aborted=True)
+        self.exit()
+
+    def execute(self, code):
+        print(code)
+        try:
+            exec(code, self.namespace)
+        except Exception:
+            self.channel.send('error', text=traceback.format_exc())
+        sys.stdout.flush()
+
+    def retire(self):
+        """Exits once no (plot-)windows are open anymore."""
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance()
+        if any(widget.isVisible() for widget in app.topLevelWidgets()):
+            app.setQuitOnLastWindowClosed(True)
+        else:
+            self.exit()
+
+    def exit(self):
+        from PyQt5.QtWidgets import QApplication
+        sys.stdout.flush()
+        QApplication.instance().quit()
+
+
+def preload(modules, paths=()):
+    """Imports the given modules, so the protocols do not need to."""
+    for path in paths:
+        if path not in sys.path:
+            sys.path.append(path)
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            print(traceback.format_exc())
+    sys.stdout.flush()
+
+
+def main():
+    start_time = time.time()
+    # the channel gets the original stdout, anything else written to
+    # the file descriptor would break the messages
+    channel = Message_Channel(os.fdopen(os.dup(1), 'wb'))
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    sys.stdout = Log_Writer(channel)
+    sys.stderr = sys.stdout
+    command_stream = os.fdopen(0, 'rb')
+
+    camels_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(camels_path)
+    sys.path.append(os.path.dirname(camels_path))
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(sys.argv)
+    app.setQuitOnLastWindowClosed(False)
+    preload(preloaded_modules)
+    from CAMELS.bluesky_handling import helper_functions
+
+    runner = Protocol_Runner(channel, command_stream)
+    helper_functions.step_callbacks.append(runner.send_step)
+    threading.Thread(target=runner.read_commands, daemon=True).start()
+    channel.send('ready', import_time=time.time() - start_time)
+    app.exec_()
+
+
+if __name__ == '__main__':
+    main()
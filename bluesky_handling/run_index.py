@@ -0,0 +1,258 @@
+"""SQLite-index of the runs in the msgpack-catalogs made by make_catalog.
+
+The msgpack catalog needs to parse all its files to find a run. The
+index keeps the start- and stop-documents of all runs (one row per uid
+with time, user, sample and protocol as indexed columns), so runs can
+be searched and the single msgpack file of a run can be opened directly.
+It is kept up to date by subscribing a `Run_Indexer` to the RunEngine,
+runs measured without it are added by `Run_Index.update_from_files`.
+"""
+
+import os
+import glob
+import json
+import sqlite3
+import threading
+
+import databroker
+import msgpack
+import msgpack_numpy
+import yaml
+
+index_filename = 'run_index.sqlite'
+
+
+def get_broker_path(catalog_name='CAMELS_CATALOG'):
+    """Returns the directory of the msgpack files of the catalog, as
+    written by make_catalog.make_yml. None if it cannot be found."""
+    fname = f'{databroker.catalog_search_path()[0]}/{catalog_name}.yml'
+    try:
+        with open(fname, 'r') as file:
+            config = yaml.safe_load(file)
+        paths = config['sources'][catalog_name]['args']['paths']
+    except (OSError, KeyError, TypeError, yaml.YAMLError):
+        return None
+    return os.path.dirname(paths[0])
+
+def get_index_path(catalog_name='CAMELS_CATALOG'):
+    """The path of the index of the catalog, None if the catalog is
+    not known."""
+    broker_path = get_broker_path(catalog_name)
+    if broker_path is None:
+        return None
+    return f'{broker_path}/{index_filename}'
+
+
+class Run_Index:
+    """The index of the runs, stored in the SQLite-file `path`.
+
+    Parameters
+    ----------
+    path : str, path
+        The file of the index, it is created if it does not exist.
+    """
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # the RunEngine calls the subscribers from its own thread
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS runs ('
+                                    'uid TEXT PRIMARY KEY, time REAL, '
+                                    'stop_time REAL, user TEXT, sample TEXT, '
+                                    'protocol TEXT, plan_name TEXT, '
+                                    'exit_status TEXT, num_events TEXT, '
+                                    'path TEXT, start TEXT, stop TEXT)')
+            for col in ['time', 'user', 'sample', 'protocol']:
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS '
+                                        f'runs_{col} ON runs ({col})')
+
+    def close(self):
+        self.connection.close()
+
+    def add_start(self, doc, path=None):
+        """Adds (or replaces) the run of the start-document `doc`."""
+        values = {'uid': doc['uid'], 'time': doc.get('time'),
+                  'user': get_name(doc.get('user')),
+                  'sample': get_name(doc.get('sample')),
+                  'protocol': doc.get('protocol') or doc.get('plan_name'),
+                  'plan_name': doc.get('plan_name'), 'path': path,
+                  'start': json.dumps(doc, default=str)}
+        keys = ', '.join(values)
+        marks = ', '.join('?' * len(values))
+        with self.lock, self.connection:
+            self.connection.execute(f'INSERT OR REPLACE INTO runs ({keys}) '
+                                    f'VALUES ({marks})', list(values.values()))
+
+    def add_stop(self, doc, path=None):
+        """Adds the stop-document to its run."""
+        with self.lock, self.connection:
+            self.connection.execute('UPDATE runs SET stop_time = ?, '
+                                    'exit_status = ?, num_events = ?, '
+                                    'stop = ?, path = COALESCE(?, path) '
+                                    'WHERE uid = ?',
+                                    (doc.get('time'), doc.get('exit_status'),
+                                     json.dumps(doc.get('num_events', {})),
+                                     json.dumps(doc, default=str), path,
+                                     doc['run_start']))
+
+    def search(self, user=None, sample=None, protocol=None, since=None,
+               until=None, exit_status=None, limit=None, before=None):
+        """Returns the runs (as dictionaries of the columns, the newest
+        first) matching all given arguments. `since`, `until` (both
+        inclusive) and `before` (exclusive) are timestamps of the start
+        of the run."""
+        conditions = []
+        args = []
+        for col, val in [('user', user), ('sample', sample),
+                         ('protocol', protocol),
+                         ('exit_status', exit_status)]:
+            if val is not None:
+                conditions.append(f'{col} = ?')
+                args.append(val)
+        if since is not None:
+            conditions.append('time >= ?')
+            args.append(since)
+        if until is not None:
+            conditions.append('time <= ?')
+            args.append(until)
+        if before is not None:
+            conditions.append('time < ?')
+            args.append(before)
+        query = 'SELECT * FROM runs'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY time DESC'
+        if limit:
+            query += f' LIMIT {int(limit)}'
+        with self.lock:
+            rows = self.connection.execute(query, args).fetchall()
+        return [row_to_dict(row) for row in rows]
+
+    def get(self, uid):
+        """Returns the run with the given uid (or the unique one
+        starting with it), None if there is none."""
+        with self.lock:
+            rows = self.connection.execute('SELECT * FROM runs WHERE uid '
+                                           'LIKE ? LIMIT 2',
+                                           (f'{uid}%',)).fetchall()
+        if len(rows) != 1:
+            return None
+        return row_to_dict(rows[0])
+
+    def __contains__(self, uid):
+        with self.lock:
+            row = self.connection.execute('SELECT 1 FROM runs WHERE uid = ?',
+                                          (uid,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def update_from_files(self, broker_path):
+        """Adds the runs of all msgpack files in `broker_path`, that
+        are not yet in the index (e.g. measured without the indexer).
+        Returns the number of added runs."""
+        with self.lock:
+            known = {row[0] for row in
+                     self.connection.execute('SELECT path FROM runs')}
+        added = 0
+        for fname in sorted(glob.glob(f'{broker_path}/*.msgpack')):
+            fname = fname.replace('\\', '/')
+            if fname in known:
+                continue
+            start, stop = read_start_stop(fname)
+            if start is None or start['uid'] in self:
+                continue
+            self.add_start(start, fname)
+            if stop is not None:
+                self.add_stop(stop, fname)
+            added += 1
+        return added
+
+    def open_run(self, uid):
+        """Returns the run `uid` as BlueskyRun, only opening its own
+        msgpack file instead of the whole catalog."""
+        run = self.get(uid)
+        if run is None or not run['path']:
+            raise KeyError(uid)
+        return open_run_file(run['path'], run['uid'])
+
+
+class Run_Indexer:
+    """Subscribe to the RunEngine to add each run to the `index`.
+
+    Parameters
+    ----------
+    index : Run_Index
+        The index to add the runs to.
+    broker_path : str, default None
+        Directory of the msgpack files, to store the file of each run.
+    """
+    def __init__(self, index, broker_path=None):
+        self.index = index
+        self.broker_path = broker_path
+
+    def __call__(self, name, doc):
+        if name == 'start':
+            self.index.add_start(doc, self.get_path(doc['uid']))
+        elif name == 'stop':
+            self.index.add_stop(doc, self.get_path(doc['run_start']))
+
+    def get_path(self, uid):
+        if self.broker_path is None:
+            return None
+        return f'{self.broker_path}/{uid}.msgpack'.replace('\\', '/')
+
+
+def get_name(data):
+    """The name of user- / sample-data, which may be a dictionary (the
+    user- and sample-tables use the key "Name", the default user
+    "name")."""
+    if isinstance(data, dict):
+        return data.get('Name', data.get('name'))
+    return data
+
+def row_to_dict(row):
+    run = dict(row)
+    for key in ['start', 'stop', 'num_events']:
+        if run[key] is not None:
+            run[key] = json.loads(run[key])
+    return run
+
+def read_start_stop(fname):
+    """Returns the start- and stop-document of the msgpack file of a
+    run (None if not found)."""
+    start = None
+    stop = None
+    try:
+        with open(fname, 'rb') as file:
+            for name, doc in msgpack.Unpacker(file, raw=False,
+                                              strict_map_key=False,
+                                              object_hook=msgpack_numpy.decode):
+                if name == 'start':
+                    start = doc
+                elif name == 'stop':
+                    stop = doc
+    except (OSError, ValueError, msgpack.UnpackException) as e:
+        print(f'Could not index {fname}: {e}')
+    return start, stop
+
+def open_run_file(path, uid):
+    """Returns the run `uid` from the msgpack file `path`."""
+    from databroker._drivers.msgpack import BlueskyMsgpackCatalog
+    return BlueskyMsgpackCatalog([path])[uid]
+
+def make_indexer(catalog_name='CAMELS_CATALOG'):
+    """Returns a Run_Indexer for the catalog, None if the catalog is
+    not known."""
+    broker_path = get_broker_path(catalog_name)
+    if broker_path is None:
+        return None
+    return Run_Indexer(Run_Index(f'{broker_path}/{index_filename}'),
+                       broker_path)
@@ -1,16 +1,45 @@
+from contextlib import ExitStack
+
 from ophyd import Device, Kind
 import bluesky.plan_stubs as bps
+from bluesky.utils import short_uid
+
+from .TriggerEpicsSignalRO import Group_Trigger_Device
+from .EpicsFieldSignal import Field_Group_Device
 
 def trigger_and_read_devices(devices, name='primary'):
     """A wrapper for the plan stup `trigger_and_read` that implements
     trigger/read for a device with several components by simply splitting
-    up the device and using a list of its components."""
+    up the device and using a list of its components.
+    A Group_Trigger_Device is triggered as a whole first, so all its
+    channels are triggered at once."""
     split_devices = []
+    group = short_uid('group_trigger')
     for dev in devices:
         if isinstance(dev, Device):
             dev.read()
+            if isinstance(dev, Group_Trigger_Device):
+                yield from bps.trigger(dev, group=group)
             for _, component in dev._get_components_of_kind(Kind.normal):
                 split_devices.append(component)
         else:
             split_devices.append(dev)
-    return bps.trigger_and_read(split_devices, name)
\ No newline at end of file
+    ret = yield from bps.trigger_and_read(split_devices, name)
+    yield from bps.wait(group)
+    return ret
+
+
+def trigger_and_read_channels(channels, name='primary'):
+    """Like `bps.trigger_and_read`, but the components of each
+    Field_Group_Device among the `channels` are read together with the
+    device's Field_Group_Reader (one CA round-trip per device instead
+    of one per field)."""
+    readers = []
+    for channel in channels:
+        parent = getattr(channel, 'parent', None)
+        if isinstance(parent, Field_Group_Device) and parent.field_group not in readers:
+            readers.append(parent.field_group)
+    with ExitStack() as stack:
+        for reader in readers:
+            stack.enter_context(reader)
+        return (yield from bps.trigger_and_read(channels, name))
@@ -92,6 +92,10 @@ class Channel_Widget(QWidget):
         self.labels_maxv = []
         self.labels_name = []
         self.labels_combobox = []
+        self.lineedits_samples = []
+        self.lineedits_rate = []
+        self.comboboxes_output = []
+        self.labels_buffered = []
         self.change_use()
         for i in range(1, 9):
             if is_input:
@@ -117,7 +121,7 @@ class Channel_Widget(QWidget):
             self.labels_name.append(label_name)
 
             shifter = 3 if i > 4 else 0
-            shifter_down = 6*((i - 1) % 4)
+            shifter_down = 9*((i - 1) % 4)
             self.layout().addWidget(usebox, shifter_down, shifter)
             self.layout().addWidget(digbox, shifter_down, 1+shifter)
             self.layout().addWidget(label_name, 1+shifter_down, shifter)
@@ -134,11 +138,24 @@ class Channel_Widget(QWidget):
                 self.labels_combobox.append(label_combo)
                 self.layout().addWidget(label_combo, 4+shifter_down, shifter)
                 self.layout().addWidget(combobox, 4+shifter_down, 1+shifter)
+                samplesline = QLineEdit('1')
+                self.lineedits_samples.append(samplesline)
+                rateline = QLineEdit('1000')
+                self.lineedits_rate.append(rateline)
+                outputbox = QComboBox()
+                outputbox.addItems(['mean', 'std', 'array'])
+                self.comboboxes_output.append(outputbox)
+                labels = [QLabel('samples per reading'),
+                          QLabel('sample rate (Hz)'), QLabel('output')]
+                self.labels_buffered.append(labels)
+                for j, widge in enumerate([samplesline, rateline, outputbox]):
+                    self.layout().addWidget(labels[j], 5+j+shifter_down, shifter)
+                    self.layout().addWidget(widge, 5+j+shifter_down, 1+shifter)
             if i % 4:
                 line = QFrame(self)
                 line.setFrameShape(QFrame.HLine)
                 line.setFrameShadow(QFrame.Sunken)
-                self.layout().addWidget(line, 5+shifter_down, shifter, 1, 2)
+                self.layout().addWidget(line, 8+shifter_down, shifter, 1, 2)
 
             if is_input and f'in{i}' in self.settings:
                 sets = self.settings[f'in{i}']
@@ -148,6 +165,9 @@ class Channel_Widget(QWidget):
                 minline.setText(str(sets['minV']))
                 maxline.setText(str(sets['maxV']))
                 nameline.setText(sets['line_name'])
+                samplesline.setText(str(sets.get('n_samples', 1)))
+                rateline.setText(str(sets.get('sample_rate', 1000)))
+                outputbox.setCurrentText(sets.get('buffered_output', 'mean'))
             elif not is_input and f'out{i}' in self.settings:
                 sets = self.settings[f'out{i}']
                 usebox.setChecked(True)
@@ -158,7 +178,7 @@ class Channel_Widget(QWidget):
         line = QFrame(self)
         line.setFrameShape(QFrame.VLine)
         line.setFrameShadow(QFrame.Sunken)
-        self.layout().addWidget(line, 0, 2, 4*6, 1)
+        self.layout().addWidget(line, 0, 2, 4*9, 1)
         self.change_use()
 
 
@@ -176,6 +196,10 @@ class Channel_Widget(QWidget):
             if self.is_input:
                 self.comboboxes[i].setHidden(not use or digi)
                 self.labels_combobox[i].setHidden(not use or digi)
+                buffered = [self.lineedits_samples[i], self.lineedits_rate[i],
+                            self.comboboxes_output[i]]
+                for widge in buffered + self.labels_buffered[i]:
+                    widge.setHidden(not use)
 
 
     def get_settings(self):
@@ -192,6 +216,11 @@ class Channel_Widget(QWidget):
             sets['maxV'] = float(text) if text else 0
             if self.is_input:
                 sets['terminal_config'] = self.comboboxes[i].currentText()
+                text = self.lineedits_samples[i].text()
+                sets['n_samples'] = int(text) if text else 1
+                text = self.lineedits_rate[i].text()
+                sets['sample_rate'] = float(text) if text else 1000
+                sets['buffered_output'] = self.comboboxes_output[i].currentText()
                 name = f'in{i+1}'
             else:
                 sets['terminal_config'] = 'default'
@@ -46,9 +46,17 @@ class Custom_DAQ_Device(Device):
                  'out7': self.out7, 'out8': self.out8}
         for nam, info in self.component_setups.items():
             comp = comps[nam]
-            comp.setup_line(info['line_name'], digital=info['digital'],
-                            terminal_config=info['terminal_config'],
-                            minV=info['minV'], maxV=info['maxV'])
+            if nam.startswith('in'):
+                comp.setup_line(info['line_name'], digital=info['digital'],
+                                terminal_config=info['terminal_config'],
+                                minV=info['minV'], maxV=info['maxV'],
+                                n_samples=info.get('n_samples', 1),
+                                sample_rate=info.get('sample_rate', 1000),
+                                buffered_output=info.get('buffered_output', 'mean'))
+            else:
+                comp.setup_line(info['line_name'], digital=info['digital'],
+                                terminal_config=info['terminal_config'],
+                                minV=info['minV'], maxV=info['maxV'])
 
 
 
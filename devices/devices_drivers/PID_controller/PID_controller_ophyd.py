@@ -5,7 +5,7 @@ from ophyd import Device
 from ophyd import Component as Cpt
 from ophyd import EpicsSignal
 
-from bluesky_handling.EpicsFieldSignal import EpicsFieldSignal, EpicsFieldSignalRO
+from bluesky_handling.EpicsFieldSignal import EpicsFieldSignal, EpicsFieldSignalRO, Field_Group_Device
 
 import numpy as np
 from scipy.optimize import root
@@ -36,9 +36,10 @@ def pt1000_inv(T):
     return ptX_inv(T)
 
 
-class PID_Controller(Device):
+class PID_Controller(Field_Group_Device):
+    put_timeout = 60
     pid_val = Cpt(EpicsFieldSignal, read_pv_name='pid_controller.VAL', name='pid_val')
-    pid_cval = Cpt(EpicsFieldSignalRO, read_pv_name='pid_controller.CVAL', name='pid_cval')
+    pid_cval = Cpt(EpicsFieldSignalRO, read_pv_name='pid_controller.CVAL', name='pid_cval', monitor=True)
     pid_kp = Cpt(EpicsFieldSignal, read_pv_name='pid_controller.KP', name='pid_kp', kind='config')
     pid_ki = Cpt(EpicsFieldSignal, read_pv_name='pid_controller.KI', name='pid_ki', kind='config')
     pid_kd = Cpt(EpicsFieldSignal, read_pv_name='pid_controller.KD', name='pid_kd', kind='config')
@@ -135,11 +136,15 @@ class PID_Controller(Device):
             next_lo = max(setpoints[setpoints <= setpoint])
             self.pid_vals = pid_val_table[setpoints == next_lo].to_dict(orient='list')
         if old_vals != self.pid_vals:
+            # write all values at once, then wait for them together
+            statuses = []
             for key in self.pid_vals:
                 if key in ['setpoint', 'stability-time', 'stability-delta'] or (key == 'bias' and self.pid_bias is None):
                     continue
                 att = getattr(self, f'pid_{key}')
-                att.put(self.pid_vals[key][0])
+                statuses.append(att.set(self.pid_vals[key][0]))
+            for status in statuses:
+                status.wait(timeout=self.put_timeout)
         self.stability_time = self.pid_vals['stability-time'][0]
         self.stability_delta = self.pid_vals['stability-delta'][0]
 
@@ -1,11 +1,11 @@
 from ophyd import EpicsSignal, EpicsSignalRO, Device
 from ophyd import Component as Cpt
 
-from bluesky_handling import TriggerEpicsSignalRO
+from bluesky_handling import TriggerEpicsSignalRO, Group_Trigger_Device
 
 
 
-class Agilent_34401(Device):
+class Agilent_34401(Group_Trigger_Device):
     mesDCV = Cpt(TriggerEpicsSignalRO, 'mesDCV')
     mesDCI = Cpt(TriggerEpicsSignalRO, 'mesDCI')
     mesACV = Cpt(TriggerEpicsSignalRO, 'mesACV')
@@ -1,10 +1,10 @@
 from ophyd import EpicsSignal, EpicsSignalRO, Device
 from ophyd import Component as Cpt
 
-from bluesky_handling import TriggerEpicsSignalRO
+from bluesky_handling import TriggerEpicsSignalRO, Group_Trigger_Device
 
 
-class Keysight_B2912(Device):
+class Keysight_B2912(Group_Trigger_Device):
     mesDCV = Cpt(TriggerEpicsSignalRO, 'mesDCV')
     mesDCI = Cpt(TriggerEpicsSignalRO, 'mesDCI')
     mesACV = Cpt(TriggerEpicsSignalRO, 'mesACV')
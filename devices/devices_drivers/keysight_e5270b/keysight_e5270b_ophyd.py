@@ -1,12 +1,12 @@
 from ophyd import EpicsSignal, EpicsSignalRO, Device
 from ophyd import Component as Cpt
 
-from bluesky_handling import TriggerEpicsSignalRO
+from bluesky_handling import TriggerEpicsSignalRO, Group_Trigger_Device
 import time as ttime
 
 
 
-class Keysight_E5270B(Device):
+class Keysight_E5270B(Group_Trigger_Device):
     setV1 = Cpt(EpicsSignal, 'setV1')
     setI1 = Cpt(EpicsSignal, 'setI1')
     mesI1 = Cpt(TriggerEpicsSignalRO, 'mesI1')
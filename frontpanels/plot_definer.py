@@ -1,7 +1,7 @@
 import copy
 
 from PyQt5.QtWidgets import QDialog, QWidget, QDialogButtonBox, QGridLayout,\
-    QLabel, QMessageBox, QPushButton
+    QLabel, QMessageBox, QPushButton, QSpinBox, QDoubleSpinBox
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont, QKeyEvent
 
@@ -64,7 +64,7 @@ class Plot_Info:
 class Fit_Info:
     def __init__(self, do_fit=False, predef_func='Linear', custom_func='',
                  use_custom_func=False, guess_params=True, initial_params=None,
-                 y='', x=''):
+                 y='', x='', update_every=1, update_time=0):
         self.do_fit = do_fit
         self.predef_func = predef_func
         self.custom_func = custom_func
@@ -77,6 +77,8 @@ class Fit_Info:
                                                  'upper bound': []}
         self.y = y or ''
         self.x = x or ''
+        self.update_every = update_every
+        self.update_time = update_time
 
     def get_name(self, stream=''):
         if self.use_custom_func:
@@ -269,6 +271,16 @@ class Fit_Definer(QWidget, Ui_Fit_Definer):
                                            tableData=fit_info.initial_params)
         self.start_params.addButton.setHidden(True)
         self.start_params.removeButton.setHidden(True)
+        label_update_every = QLabel('Update fit every N points (0: off)')
+        self.spinBox_update_every = QSpinBox()
+        self.spinBox_update_every.setRange(0, 1000000)
+        label_update_time = QLabel('Update fit every T seconds (0: off)')
+        self.doubleSpinBox_update_time = QDoubleSpinBox()
+        self.doubleSpinBox_update_time.setRange(0, 86400)
+        self.layout().addWidget(label_update_every, 5, 0)
+        self.layout().addWidget(self.spinBox_update_every, 5, 1)
+        self.layout().addWidget(label_update_time, 6, 0)
+        self.layout().addWidget(self.doubleSpinBox_update_time, 6, 1)
         self.load_data()
 
         self.checkBox_fit.clicked.connect(self.change_func)
@@ -327,6 +339,8 @@ class Fit_Definer(QWidget, Ui_Fit_Definer):
         self.lineEdit_custom_func.setText(self.fit_info.custom_func)
         self.radioButton_custom_func.setChecked(self.fit_info.use_custom_func)
         self.checkBox_guess.setChecked(self.fit_info.guess_params)
+        self.spinBox_update_every.setValue(self.fit_info.update_every or 0)
+        self.doubleSpinBox_update_time.setValue(self.fit_info.update_time or 0)
 
     def get_data(self):
         self.fit_info.initial_params = self.start_params.update_table_data()
@@ -335,6 +349,8 @@ class Fit_Definer(QWidget, Ui_Fit_Definer):
         self.fit_info.custom_func = self.lineEdit_custom_func.text()
         self.fit_info.use_custom_func = self.radioButton_custom_func.isChecked()
         self.fit_info.guess_params = self.checkBox_guess.isChecked()
+        self.fit_info.update_every = self.spinBox_update_every.value()
+        self.fit_info.update_time = self.doubleSpinBox_update_time.value()
 
 
 def add_fit(tableData, fit):
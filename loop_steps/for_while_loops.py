@@ -9,6 +9,15 @@ from utility.variable_tool_tip_box import Variable_Box
 
 from gui.for_loop import Ui_for_loop_config
 
+# number of iterations per enumerator of the for-loops, the time_weight
+# asks for them repeatedly while building (e.g. np.loadtxt of a file)
+iteration_cache = {}
+
+def clear_iteration_cache():
+    """Called at each build, so changed files are read again."""
+    iteration_cache.clear()
+
+
 class While_Loop_Step(Loop_Step_Container):
     """A loopstep that adds a simple While Loop with a condition, that
     may be just written as python-code.
@@ -154,20 +163,38 @@ class For_Loop_Step(Loop_Step_Container):
         variables_handling.loop_step_variables.update(variables)
         super().update_variables()
 
-    def get_protocol_string(self, n_tabs=1):
-        """The loop is enumerating over the selected points."""
-        tabs = '\t'*n_tabs
+    def get_enumerator(self):
+        """Returns the string of the values the loop iterates over."""
         if self.loop_type in ['start - stop', 'start - min - max - stop',
                               'start - max - min - stop']:
-            enumerator = get_space_string(self.start_val, self.stop_val,
-                                          self.n_points, self.min_val,
-                                          self.max_val, self.loop_type,
-                                          self.sweep_mode,
-                                          self.include_end_points)
+            return get_space_string(self.start_val, self.stop_val,
+                                    self.n_points, self.min_val,
+                                    self.max_val, self.loop_type,
+                                    self.sweep_mode, self.include_end_points)
         elif self.loop_type == 'Value-List':
-            enumerator = self.val_list
-        else:
-            enumerator = f'np.loadtxt("{self.file_path}")'
+            return self.val_list
+        return f'np.loadtxt("{self.file_path}")'
+
+    def get_n_iterations(self):
+        """Returns the number of iterations by evaluating the loop's
+        values. If that fails, the n_iterations of the last preview in
+        the config is used. The result is kept in `iteration_cache`
+        until the next build."""
+        enumerator = str(self.get_enumerator())
+        if enumerator not in iteration_cache:
+            try:
+                vals = eval(enumerator, {'np': np, 'nan': np.nan})
+                iteration_cache[enumerator] = len(np.atleast_1d(vals))
+            except Exception:
+                iteration_cache[enumerator] = None
+        if iteration_cache[enumerator] is not None:
+            self.n_iterations = iteration_cache[enumerator]
+        return self.n_iterations
+
+    def get_protocol_string(self, n_tabs=1):
+        """The loop is enumerating over the selected points."""
+        tabs = '\t'*n_tabs
+        enumerator = self.get_enumerator()
         protocol_string = super().get_protocol_string(n_tabs)
         protocol_string += f'{tabs}for {self.name.replace(" ", "_")}_Count, {self.name.replace(" ", "_")}_Value in enumerate({enumerator}):\n'
         protocol_string += f'{tabs}\tnamespace.update({{"{self.name.replace(" ", "_")}_Count": {self.name.replace(" ", "_")}_Count, "{self.name.replace(" ", "_")}_Value": {self.name.replace(" ", "_")}_Value}})\n'
@@ -175,9 +202,8 @@ class For_Loop_Step(Loop_Step_Container):
         self.update_time_weight()
         return protocol_string
 
-    def update_time_weight(self):
-        super().update_time_weight()
-        self.time_weight *= self.n_iterations
+    def get_child_runs(self):
+        return self.get_n_iterations()
 
 class For_Loop_Step_Config(Loop_Step_Config):
     """Configuration-Widget for the for-loop step."""
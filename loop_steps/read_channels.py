@@ -53,7 +53,8 @@ class Read_Channels(Loop_Step):
     def get_protocol_string(self, n_tabs=1):
         """In the protocol, at first a list `channels` is defined,
         including all the channels, that are selected to be read. Then
-        bps.trigger_and_read is called on these channels."""
+        special_plan_stubs.trigger_and_read_channels (bps.trigger_and_read,
+        reading the fields of a device together) is called on them."""
         tabs = '\t' * n_tabs
         protocol_string = super().get_protocol_string(n_tabs)
         protocol_string += f'{tabs}channels = ['
@@ -72,7 +73,7 @@ class Read_Channels(Loop_Step):
                     protocol_string += f'devs["{name}"]'
                 inserted = True
         protocol_string += ']\n'
-        protocol_string += f'{tabs}yield from bps.trigger_and_read(channels, name=stream_name)\n'
+        protocol_string += f'{tabs}yield from trigger_and_read_channels(channels, name=stream_name)\n'
         return protocol_string
 
 
@@ -33,6 +33,13 @@ class Simple_Sweep(For_Loop_Step):
         self.fit_params = step_info['fit_params'] if 'fit_params' in step_info else {}
         self.guess_fit_params = step_info['guess_fit_params'] if 'guess_fit_params' in step_info else True
 
+    def update_time_weight(self):
+        """The sweep is a single step, its points are the work units."""
+        self.time_weight = 1
+
+    def get_work_units(self):
+        return max(self.get_n_iterations(), 1)
+
     def update_used_devices(self):
         self.used_devices = []
         set_device = variables_handling.channels[self.sweep_channel].device
@@ -112,7 +119,7 @@ class Simple_Sweep(For_Loop_Step):
         protocol_string += f'{tabs}\tnamespace.update({{"{self.name.replace(" ", "_")}_Count": {self.name.replace(" ", "_")}_Count, "{self.name.replace(" ", "_")}_Value": {self.name.replace(" ", "_")}_Value}})\n'
         protocol_string += f'{tabs}\tyield from bps.abs_set({setter}, {self.name.replace(" ", "_")}_Value, group="A")\n'
         protocol_string += f'{tabs}\tyield from bps.wait("A")\n'
-        protocol_string += f'{tabs}\tyield from bps.trigger_and_read(channels, name={stream})\n'
+        protocol_string += f'{tabs}\tyield from trigger_and_read_channels(channels, name={stream})\n'
         protocol_string += f'{tabs}yield from helper_functions.get_fit_results(all_fits, namespace, True, {stream}, True, plots)\n'
         self.update_time_weight()
         return protocol_string
@@ -70,9 +70,9 @@ class Loop_Step:
     def get_protocol_string(self, n_tabs=1):
         """Returns the string that is written into the protocol-file. To
         make use of the time_weight and status bar, it should start with
-        printing, that the loop_step starts."""
+        reporting, that the loop_step starts."""
         tabs = '\t'*n_tabs
-        protocol_string = f'{tabs}print("starting loop_step {self.full_name}")\n'
+        protocol_string = f'{tabs}helper_functions.report_step("{self.full_name}")\n'
         protocol_string += f'{tabs}yield from bps.checkpoint()\n'
         return protocol_string
 
@@ -95,6 +95,20 @@ class Loop_Step:
         """The time_weight of the children is included."""
         self.time_weight = 1
 
+    def get_work_units(self):
+        """The number of similar units of work (e.g. points of a sweep)
+        done by this step, used for the time-statistics."""
+        return 1
+
+    def get_step_info(self, info, multiplier=1):
+        """Adds the type, used devices, expected number of starts and
+        work units of this step to `info` (by its full_name), used for
+        the progress and ETA of a running protocol."""
+        info[self.full_name] = {'step_type': self.step_type,
+                                'devices': sorted(self.used_devices),
+                                'count': multiplier,
+                                'units': self.get_work_units()}
+
 
 class Loop_Step_Container(Loop_Step):
     """Parent Class for loop_steps that should contain further steps
@@ -162,7 +176,19 @@ class Loop_Step_Container(Loop_Step):
         """The time_weight of the children is included."""
         self.time_weight = 1
         for child in self.children:
-            self.time_weight += child.time_weight
+            child.update_time_weight()
+            self.time_weight += child.time_weight * self.get_child_runs()
+
+    def get_child_runs(self):
+        """How often the children are run, for a loop the number of
+        iterations."""
+        return 1
+
+    def get_step_info(self, info, multiplier=1):
+        """Also adds the info of the children."""
+        super().get_step_info(info, multiplier)
+        for child in self.children:
+            child.get_step_info(info, multiplier * self.get_child_runs())
 
 
     def get_children_strings(self, n_tabs=1):
@@ -2,6 +2,7 @@ import os
 import sys
 from collections import ChainMap
 import threading
+import time
 import numpy as np
 import lmfit
 
@@ -14,12 +15,15 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg,\
 
 from PyQt5.QtWidgets import QWidget, QGridLayout, QApplication, QPushButton,\
     QTableWidgetItem, QColorDialog, QComboBox
-from PyQt5.QtCore import pyqtSignal, QObject, Qt
+from PyQt5.QtCore import pyqtSignal, QObject, Qt, QTimer
 from PyQt5.QtGui import QIcon
 
 from gui.plot_options import Ui_Plot_Options
 from bluesky_handling.evaluation_helper import Evaluator
-from ophyd import SignalRO, Device, Component, BlueskyInterface, Kind
+from utility.data_buffer import Data_Buffer, Min_Max_Decimation, decimate
+from utility.incremental_fit import get_polynomial_fit
+from ophyd import SignalRO, Device, Component
+from event_model import pack_event_page
 
 dark_mode = False
 def activate_dark_mode():
@@ -40,7 +44,8 @@ class PlotWidget(QWidget):
     def __init__(self, x_name=None, y_names=(), *, legend_keys=None, xlim=None,
                  ylim=None, epoch='run', parent=None, namespace=None, ylabel='',
                  xlabel='', title='', stream_name='primary', fits=None,
-                 do_plot=True, **kwargs):
+                 do_plot=True, max_fps=20, max_points=None, lod=True,
+                 **kwargs):
         super().__init__(parent=parent)
         canvas = MPLwidget()
         if isinstance(y_names, str):
@@ -81,7 +86,9 @@ class PlotWidget(QWidget):
             name = f'{label}_{fit["y"]}_v_{fit["x"]}'
             livefit = LiveFit_Eva(model, fit["y"], {'x': fit["x"]}, init_guess,
                                   evaluator=eva, name=name.replace(' ', '_'),
-                                  params=params, stream_name=stream_name)
+                                  params=params, stream_name=stream_name,
+                                  update_every=fit.get('update_every', 1),
+                                  update_time=fit.get('update_time', 0))
             self.liveFits.append(livefit)
             self.liveFitPlots.append(Fit_Plot_No_Init_Guess(livefit, ax=self.ax,
                                                             legend_keys=[name]))
@@ -90,8 +97,17 @@ class PlotWidget(QWidget):
                                       ax=canvas.axes, evaluator=eva,
                                       xlabel=xlabel, ylabel=ylabel, title=title,
                                       stream_name=stream_name, do_plot=do_plot,
-                                      fitPlots=self.liveFitPlots, **kwargs)
+                                      fitPlots=self.liveFitPlots,
+                                      max_fps=max_fps, max_points=max_points,
+                                      lod=lod, **kwargs)
         self.livePlot.new_data.connect(self.show)
+        for livefit in self.liveFits:
+            livefit.result_callbacks.append(self.livePlot.fit_updated)
+        # redraws coalesced events, even if no further event arrives
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.timeout.connect(self.livePlot.render_pending)
+        if max_fps:
+            self.redraw_timer.start(int(1000 / max_fps))
         self.toolbar = NavigationToolbar2QT(canvas, self)
 
 
@@ -122,8 +138,11 @@ class PlotWidget(QWidget):
         self.livePlot.clear_plot()
 
     def autoscale(self):
+        # drop the decimation of a zoomed range, so the limits are those
+        # of the full data
+        self.livePlot.zoom_indices = {}
         self.ax.autoscale()
-        self.ax.figure.canvas.draw_idle()
+        self.livePlot.update_plot()
 
     def show_options(self):
         if self.options_open:
@@ -138,9 +157,40 @@ class PlotWidget(QWidget):
 
 
 class LiveFit_Eva(LiveFit):
+    """LiveFit that uses the Evaluator for formulas as x or y.
+
+    The fit is updated every `update_every` points and / or every
+    `update_time` seconds (0 or None to disable either). If `background`
+    is True, the fits run in a worker thread that always fits the newest
+    data, so a request coming in while fitting replaces the older one
+    that is still waiting. A result of the worker is handed back and
+    published with the next event (or at the stop), so the `ophyd_fit`
+    is updated and all `result_callbacks` are called from the same
+    thread as the other callbacks, never from the worker.
+
+    With `warm_start`, each refit starts from the parameters of the last
+    result and is skipped, if the last result describes the new points
+    as well as the fitted ones (rms of their residuals not more than
+    `skip_rtol` worse). To not get stuck in a minimum found with only a
+    few points, the fit starts from the initial parameters again each
+    time the number of points doubled. Unbounded linear and polynomial models are
+    solved in closed form from running sums instead
+    (see `utility.incremental_fit`). These fits are not handed to the
+    worker thread, even with `background`: solving the small system is
+    cheaper than the snapshot of the data for the worker, so they run
+    directly in the callback thread."""
     def __init__(self, model, y, independent_vars, init_guess=None, *,
                  update_every=1, evaluator=None, name='', params=None,
-                 stream_name='primary'):
+                 stream_name='primary', update_time=0, background=True,
+                 warm_start=True, skip_rtol=0.05):
+        # needed by _reset, which is already called by LiveFit.__init__
+        self.fit_condition = threading.Condition()
+        self.fit_request = None
+        self.pending_result = None
+        self.fit_generation = 0
+        self.n_fitted = 0
+        self.n_cold_fit = 0
+        self.polynomial_fit = get_polynomial_fit(model, params)
         super().__init__(model=model, y=y, independent_vars=independent_vars,
                          init_guess=init_guess, update_every=update_every)
         # change_name = name.replace(' ', '_').replace(':', '_').replace('.', '_')
@@ -148,11 +198,21 @@ class LiveFit_Eva(LiveFit):
         self.name = f'{name}_{stream_name}'
         self.params = params
         name = name.replace('(', '').replace(')', '').replace('.', '')
-        self.ophyd_fit = Fit_Ophyd(name, name=name, params=params)
+        self.ophyd_fit = make_fit_ophyd(model.param_names, name)
         self.stream_name = stream_name
+        self.update_time = update_time
+        self.background = background
+        self.warm_start = warm_start
+        self.skip_rtol = skip_rtol
+        self.fitting = False
+        self.fit_thread = None
+        self.last_fit_time = time.monotonic()
+        self.last_timestamp = 0
+        self.result_callbacks = []
 
 
     def event(self, doc):
+        self.publish_pending()
         idv = {}
         for k, v in self.independent_vars.items():
             try:
@@ -174,36 +234,207 @@ class LiveFit_Eva(LiveFit):
             y = self.eva.eval(self.y)
         # Always stash the data for the next time the fit is updated.
         self.update_caches(y, idv)
-        self.__stale = True
+        self.last_timestamp = doc['time']
 
         # Maybe update the fit or maybe wait.
-        if self.update_every is not None:
-            i = len(self.ydata)
-            N = len(self.model.param_names)
-            if i < N:
-                # not enough points to fit yet
-                pass
-            elif (i == N) or ((i - 1) % self.update_every == 0):
-                self.update_fit()
-                self.ophyd_fit.update_data(self.result, doc['time'])
-                # self.ophyd_fit.result = self.result.best_values
-                # self.ophyd_fit.timestamp = doc['time']
-        super().event(doc)
-
-    def update_fit(self):
+        if self.fit_due(len(self.ydata) - 1):
+            self.request_fit()
+
+    def event_page(self, doc):
+        """Same as `event`, but for all rows of an event_page at once.
+        The formulas are evaluated once for the whole page and the fit is
+        updated at most once."""
+        self.publish_pending()
+        idv = {}
+        for k, v in self.independent_vars.items():
+            idv[k] = get_page_values(v, doc, self.eva)
+        y = get_page_values(self.y, doc, self.eva)
+        n_before = len(self.ydata)
+        self.ydata.extend(y)
+        for k, v in self.independent_vars_data.items():
+            v.extend(idv[k])
+        if self.polynomial_fit is not None:
+            self.polynomial_fit.add(*idv.values(), y)
+        self.last_timestamp = doc['time'][-1]
+
+        if self.fit_due(n_before):
+            self.request_fit()
+
+    def fit_due(self, n_before):
+        """Whether the fit should be updated, after the points starting
+        at index `n_before` were added."""
+        i = len(self.ydata)
         N = len(self.model.param_names)
-        if len(self.ydata) < N:
+        if i < N:
+            # not enough points to fit yet
+            return False
+        if self.update_time and time.monotonic() - self.last_fit_time >= self.update_time:
+            return True
+        if not self.update_every:
+            return False
+        return any((j == N) or ((j - 1) % self.update_every == 0)
+                   for j in range(max(n_before + 1, N), i + 1))
+
+    def update_caches(self, y, independent_vars):
+        super().update_caches(y, independent_vars)
+        if self.polynomial_fit is not None:
+            self.polynomial_fit.add(*independent_vars.values(), y)
+
+    def request_fit(self):
+        """Fits directly, or hands a snapshot of the data to the worker
+        thread if `background` is True. Closed-form polynomial fits are
+        always solved directly, see the class docstring."""
+        self.last_fit_time = time.monotonic()
+        if not self.background or self.polynomial_fit is not None:
+            if self.update_fit(allow_skip=True):
+                self.publish_result(self.last_timestamp)
             return
+        request = (list(self.ydata),
+                   {k: list(v) for k, v in self.independent_vars_data.items()},
+                   self.last_timestamp, self.fit_generation)
+        with self.fit_condition:
+            self.fit_request = request
+            self.fit_condition.notify_all()
+        if self.fit_thread is None:
+            self.fit_thread = threading.Thread(target=self.fit_worker,
+                                               daemon=True)
+            self.fit_thread.start()
+
+    def fit_worker(self):
+        """Runs in the worker thread. Always takes the newest request,
+        results of requests from before a `_reset` are discarded. The
+        result is only stored as `pending_result`, see
+        `publish_pending`."""
+        while True:
+            with self.fit_condition:
+                while self.fit_request is None:
+                    self.fit_condition.wait()
+                ydata, idv, timestamp, generation = self.fit_request
+                self.fit_request = None
+                self.fitting = True
+            try:
+                result = self.fit_data(ydata, idv, allow_skip=True)
+            except Exception as e:
+                print(f'Fit {self.name} failed: {e}')
+                result = None
+            with self.fit_condition:
+                self.fitting = False
+                if result is not None and result is not self.result\
+                        and generation == self.fit_generation:
+                    self.pending_result = (result, len(ydata), timestamp)
+                self.fit_condition.notify_all()
+
+    def take_pending(self):
+        """Makes the result handed back by the worker the current one,
+        returns its timestamp (None if there is none)."""
+        with self.fit_condition:
+            pending, self.pending_result = self.pending_result, None
+        if pending is None:
+            return None
+        self.result, self.n_fitted, timestamp = pending
+        return timestamp
+
+    def publish_pending(self):
+        """Publishes the result of the worker, if there is a new one.
+        Called from the thread of the other callbacks."""
+        timestamp = self.take_pending()
+        if timestamp is not None:
+            self.publish_result(timestamp)
+
+    def wait_for_fit(self):
+        """Drops a waiting request, waits for a running fit and then fits
+        all the data, if it is not fitted yet. Used when the result is
+        needed (e.g. at the end of a sweep)."""
+        with self.fit_condition:
+            self.fit_request = None
+            while self.fitting:
+                self.fit_condition.wait()
+        self.take_pending()
+        if self.n_fitted != len(self.ydata):
+            self.update_fit()
+        if self.result is not None:
+            self.publish_result(self.last_timestamp)
+
+    def result_values(self):
+        """Returns the values of all parameters of the model (including
+        derived ones like fwhm) of the current result."""
+        return get_result_values(self.result)
+
+    def publish_result(self, timestamp):
+        self.ophyd_fit.update_data(self.result, timestamp)
+        for callback in self.result_callbacks:
+            callback()
+
+    def stop(self, doc):
+        self.wait_for_fit()
+        super().stop(doc)
+
+    def _reset(self):
+        with self.fit_condition:
+            self.fit_request = None
+            self.pending_result = None
+            self.fit_generation += 1
+        self.n_fitted = 0
+        self.n_cold_fit = 0
+        if self.polynomial_fit is not None:
+            self.polynomial_fit.reset()
+        super()._reset()
+
+    def update_fit(self, allow_skip=False):
+        """Fits all the data, returns whether there is a new result."""
+        N = len(self.model.param_names)
+        if len(self.ydata) < N:
+            return False
+        if self.polynomial_fit is not None:
+            result = self.polynomial_fit.result()
         else:
-            kwargs = {}
-            kwargs.update(self.independent_vars_data)
-            kwargs.update(self.init_guess)
-            if self.params:
-                self.result = self.model.fit(self.ydata, params=self.params,
-                                             **kwargs)
-            else:
-                self.result = self.model.fit(self.ydata, **kwargs)
-            self.__stale = False
+            result = self.fit_data(self.ydata, self.independent_vars_data,
+                                   allow_skip)
+        if result is None or result is self.result:
+            return False
+        self.result = result
+        self.n_fitted = len(self.ydata)
+        return True
+
+    def fit_data(self, ydata, independent_vars_data, allow_skip=False):
+        """Fits the model to the given data. If `allow_skip`, the last
+        result is returned, if it still describes the data."""
+        if allow_skip and self.result_is_current(ydata, independent_vars_data):
+            return self.result
+        kwargs = {}
+        kwargs.update(independent_vars_data)
+        if self.warm_start and self.result is not None\
+                and len(ydata) < 2 * self.n_cold_fit:
+            return self.model.fit(ydata, params=self.result.params, **kwargs)
+        self.n_cold_fit = len(ydata)
+        kwargs.update(self.init_guess)
+        if self.params:
+            return self.model.fit(ydata, params=self.params, **kwargs)
+        return self.model.fit(ydata, **kwargs)
+
+    def result_is_current(self, ydata, independent_vars_data):
+        """Whether the rms of the residuals of the points added since the
+        last fit is at most `skip_rtol` worse than the one of the fitted
+        points."""
+        n = self.n_fitted
+        if not self.warm_start or self.result is None or len(ydata) <= n:
+            return False
+        new_x = {k: np.asarray(v[n:]) for k, v in independent_vars_data.items()}
+        residual = np.asarray(ydata[n:]) - self.result.eval(**new_x)
+        new_rms = np.sqrt(np.mean(residual**2))
+        old_rms = np.sqrt(self.result.chisqr / self.result.ndata)
+        return new_rms <= (1 + self.skip_rtol) * old_rms
+
+def get_page_values(key, doc, evaluator):
+    """Returns the values of `key` for all rows of the event_page `doc`.
+    They are either taken directly from the page or evaluated as formula
+    over the whole page by the `evaluator`."""
+    if key in doc['data']:
+        return np.asarray(doc['data'][key])
+    if key in ('time', 'seq_num'):
+        return np.asarray(doc[key])
+    return evaluator.eval_page(key, doc)
+
 
 class Fit_Signal(SignalRO):
     # def __init__(self,  name, value=0., timestamp=None, parent=None, labels=None, kind='hinted', tolerance=None, rtolerance=None, metadata=None, cl=None, attr_name=''):
@@ -213,61 +444,101 @@ class Fit_Signal(SignalRO):
         self._readback = result
         self._metadata['timestamp'] = timestamp
 
+class Fit_Covar_Signal(Fit_Signal):
+    """Array-signal for the covariance matrix of a fit with `n_params`
+    parameters. If the fit provides no covariance, it is filled with
+    nan, so the shape of the data stays the same."""
+    def __init__(self, *args, n_params=0, **kwargs):
+        self.n_params = n_params
+        kwargs.setdefault('value', np.full((n_params, n_params), np.nan))
+        super().__init__(*args, **kwargs)
+
+    def update_data(self, result, timestamp):
+        if result is None:
+            result = np.full((self.n_params, self.n_params), np.nan)
+        super().update_data(np.asarray(result), timestamp)
+
+
 class Fit_Ophyd(Device):
-    a = Component(Fit_Signal, name='a')
-    b = Component(Fit_Signal, name='b')
-    c = Component(Fit_Signal, name='c')
-    d = Component(Fit_Signal, name='d')
-    e = Component(Fit_Signal, name='e')
-    f = Component(Fit_Signal, name='f')
-    g = Component(Fit_Signal, name='g')
-    h = Component(Fit_Signal, name='h')
-    i = Component(Fit_Signal, name='i')
-    j = Component(Fit_Signal, name='j')
-    k = Component(Fit_Signal, name='k')
-    l = Component(Fit_Signal, name='l')
-    m = Component(Fit_Signal, name='m')
-    n = Component(Fit_Signal, name='n')
-    o = Component(Fit_Signal, name='o')
-    p = Component(Fit_Signal, name='p')
-    q = Component(Fit_Signal, name='q')
-    r = Component(Fit_Signal, name='r')
-    covar = Component(Fit_Signal, name='covar')
+    """Base class of the devices publishing the results of a fit. Use
+    `make_fit_ophyd` to get a device with one Fit_Signal per parameter
+    of the model and the covariance `covar`."""
+    param_attrs = {}
 
     def __init__(self, prefix='', *, name, kind=None, read_attrs=None,
-                 configuration_attrs=None, parent=None, params=None, **kwargs):
+                 configuration_attrs=None, parent=None, **kwargs):
         super().__init__(prefix=prefix, name=name, kind=kind,
                          read_attrs=read_attrs,
                          configuration_attrs=configuration_attrs, parent=parent,
                          **kwargs)
-        self.params = params.keys()
-        order = [self.a, self.b, self.c, self.d, self.e, self.f, self.g, self.h,
-                 self.i, self.j, self.k, self.l, self.m, self.n, self.o, self.p,
-                 self.q, self.r]
-        self.used_comps = [self.covar]
-        for i, comp in enumerate(self.params):
-            order[i].name = f'{name}_{comp}'
-            self.used_comps.append(order[i])
+        self.params = list(self.param_attrs)
+        self.param_signals = {param: getattr(self, attr)
+                              for param, attr in self.param_attrs.items()}
+        self.used_comps = [self.covar] + list(self.param_signals.values())
 
     def update_data(self, result, timestamp):
-        order = [self.a, self.b, self.c, self.d, self.e, self.f, self.g, self.h,
-                 self.i, self.j, self.k, self.l, self.m, self.n, self.o, self.p,
-                 self.q, self.r]
-        for i, comp in enumerate(self.params):
-            order[i].update_data(result.best_values[comp], timestamp)
-        self.covar.update_data(result.covar, timestamp)
-
-
-
-    def read(self):
-        res = BlueskyInterface.read(self)
-        i = 1
-        for _, component in self._get_components_of_kind(Kind.normal):
-            res.update(component.read())
-            i += 1
-            if i > len(self.params):
-                break
-        return res
+        values = get_result_values(result)
+        for param, signal in self.param_signals.items():
+            signal.update_data(values[param], timestamp)
+        self.covar.update_data(get_full_covar(result, self.params), timestamp)
+
+
+def get_result_values(result):
+    """The parameter values of a fit result, for lmfit's ModelResult
+    including the derived parameters, which are not in best_values."""
+    if hasattr(result, 'params'):
+        return result.params.valuesdict()
+    return result.best_values
+
+
+def get_full_covar(result, param_names):
+    """The covariance matrix of `result` for all `param_names`. lmfit's
+    covar only covers the varying parameters (`result.var_names`), the
+    rows and columns of the fixed ones are nan."""
+    n = len(param_names)
+    full = np.full((n, n), np.nan)
+    covar = getattr(result, 'covar', None)
+    if covar is None:
+        return full
+    covar = np.asarray(covar)
+    var_names = getattr(result, 'var_names', None) or list(param_names)
+    if covar.shape != (len(var_names), len(var_names)):
+        return full
+    pairs = [(i, param_names.index(name)) for i, name in enumerate(var_names)
+             if name in param_names]
+    if pairs:
+        cov_index, full_index = zip(*pairs)
+        full[np.ix_(full_index, full_index)] = covar[np.ix_(cov_index, cov_index)]
+    return full
+
+
+_fit_ophyd_classes = {}
+
+def get_fit_ophyd_class(param_names):
+    """Returns the subclass of Fit_Ophyd for the given parameters. The
+    classes are created once and cached by the tuple of parameter
+    names."""
+    param_names = tuple(param_names)
+    if param_names not in _fit_ophyd_classes:
+        param_attrs = {}
+        components = {}
+        for param in param_names:
+            attr = param
+            if hasattr(Fit_Ophyd, attr) or attr == 'covar':
+                attr = f'param_{param}'
+            param_attrs[param] = attr
+            components[attr] = Component(Fit_Signal)
+        components['covar'] = Component(Fit_Covar_Signal,
+                                         n_params=len(param_names))
+        components['param_attrs'] = param_attrs
+        classname = f'Fit_Ophyd_{"_".join(param_names)}'
+        _fit_ophyd_classes[param_names] = type(classname, (Fit_Ophyd,),
+                                               components)
+    return _fit_ophyd_classes[param_names]
+
+def make_fit_ophyd(param_names, name):
+    """Creates the device for a fit with the given parameters."""
+    return get_fit_ophyd_class(param_names)(name, name=name)
 
 
 
@@ -299,6 +570,14 @@ class Fit_Plot_No_Init_Guess(LiveFitPlot):
 
     def event(self, doc):
         self.livefit.event(doc)
+        self.draw_fit()
+        # Intentionally override LivePlot.event. Do not call super().
+
+    def event_page(self, doc):
+        self.livefit.event_page(doc)
+        self.draw_fit()
+
+    def draw_fit(self):
         if self.livefit.result is not None:
             # Evaluate the model function at equally-spaced points.
             # To determine the domain of x, use xlim if availabe. Otherwise,
@@ -316,7 +595,6 @@ class Fit_Plot_No_Init_Guess(LiveFitPlot):
             # update kwargs to inital guess
             kwargs.update(self.livefit.result.init_values)
             self.update_plot()
-        # Intentionally override LivePlot.event. Do not call super().
 
     def update_plot(self):
         self.current_line.set_data(self.x_data, self.y_data)
@@ -420,7 +698,18 @@ class MultiLivePlot(LivePlot, QObject):
     def __init__(self, ys=(), x=None, *, legend_keys=None, xlim=None, ylim=None,
                  ax=None, epoch='run', xlabel='', ylabel='', evaluator=None,
                  title='', stream_name='primary', do_plot=True, fitPlots=None,
-                 **kwargs):
+                 max_fps=20, max_points=None, lod=True, **kwargs):
+        """`max_fps` limits how often the plot is redrawn per second, all
+        events in between are drawn together with the next frame. If it
+        is 0 or None, the plot is redrawn for every event.
+        `rendered_frames` and `dropped_frames` count the redraws that
+        were done and the ones that were skipped because of this.
+        If `max_points` is given, only the last `max_points` points are
+        kept and shown (strip-chart).
+        If `lod` is True and a line has more points than the axes has
+        pixels, only its min/max-decimation is drawn (see
+        `utility.data_buffer.Min_Max_Decimation`), the data itself is
+        kept in full resolution."""
         LivePlot.__init__(self, y=ys[0], x=x, legend_keys=legend_keys,
                           xlim=xlim, ylim=ylim, ax=ax, epoch=epoch, **kwargs)
         QObject.__init__(self)
@@ -432,6 +721,19 @@ class MultiLivePlot(LivePlot, QObject):
         self.desc = ''
         self.do_plot = do_plot
         self.fitPlots = fitPlots or []
+        self.max_fps = max_fps
+        self.max_points = max_points
+        self.lod = lod
+        self.decimations = {}
+        self.zoom_indices = {}
+        self.xlim_cid = None
+        self.last_frame = 0
+        self.redraw_pending = False
+        self.fits_changed = False
+        self.pending_lock = threading.Lock()
+        self.pending_events = []
+        self.rendered_frames = 0
+        self.dropped_frames = 0
         if isinstance(ys, str):
             ys = [ys]
 
@@ -473,22 +775,29 @@ class MultiLivePlot(LivePlot, QObject):
 
         self.__setup = setup
         self._epoch_offset = 0
-        self.x_data = []
+        self.x_data = Data_Buffer(max_points=max_points)
         self.y_data = {}
         self.y_names = ys
         self.ys = get_obj_fields(ys)
         for y in ys:
-            self.y_data[y] = []
+            self.y_data[y] = Data_Buffer(max_points=max_points)
         self.current_lines = {}
+        self.non_scalar = set()
 
     def start(self, doc):
         self.__setup()
         # The doc is not used; we just use the signal that a new run began.
         self._epoch_offset = doc['time']  # used if self.x == 'time'
-        self.x_data = []
+        self.x_data = Data_Buffer(max_points=self.max_points)
         self.y_data = {}
         for y in self.ys:
-            self.y_data[y] = []
+            self.y_data[y] = Data_Buffer(max_points=self.max_points)
+        self.reset_decimation()
+        with self.pending_lock:
+            self.pending_events = []
+        if self.xlim_cid is None:
+            self.xlim_cid = self.ax.callbacks.connect('xlim_changed',
+                                                      self.xlim_changed)
         # label = " :: ".join(
             # [str(doc.get(name, name)) for name in self.legend_keys])
         kwargs = ChainMap({'ls': 'None', 'marker': 'x'})
@@ -517,60 +826,124 @@ class MultiLivePlot(LivePlot, QObject):
             self.desc = doc['uid']
 
     def clear_plot(self):
+        with self.pending_lock:
+            self.pending_events = []
         self.x_data.clear()
         for y in self.y_data:
             self.y_data[y].clear()
+        self.reset_decimation()
+
+    def reset_decimation(self):
+        self.decimations = {}
+        self.zoom_indices = {}
 
     def event(self, doc):
-        """Unpack data from the event and call self.update()."""
-        # This outer try/except block is needed because multiple event
-        # streams will be emitted by the RunEngine and not all event
-        # streams will have the keys we want.
-        # This inner try/except block handles seq_num and time, which could
-        # be keys in the data or accessing the standard entries in every
-        # event.
+        """Buffers the event. The buffered events are evaluated and
+        drawn together as one event_page with the next frame (see
+        `flush_events`), the RunEngine only emits single events. The fits
+        get every event directly, so their results are up to date at the
+        end of a sweep."""
         if doc['descriptor'] != self.desc:
             return
-        try:
-            new_x = doc['data'][self.x]
-        except KeyError:
-            if self.x in ('time', 'seq_num'):
-                new_x = doc[self.x]
-            else:
-                if not self.eva.is_to_date(doc['time']):
-                    self.eva.event(doc)
-                new_x = self.eva.eval(self.x)
-
-        new_y = {}
-        for y in self.ys:
-            try:
-                new_y[y] = doc['data'][y]
-            except KeyError:
-                if not self.eva.is_to_date(doc['time']):
-                    self.eva.event(doc)
-                new_y[y] = self.eva.eval(y)
-
+        with self.pending_lock:
+            self.pending_events.append(doc)
+        for fit in self.fitPlots:
+            fit.event(doc)
+        self.request_redraw()
 
+    def event_page(self, doc):
+        """Same as `event`, but for all rows of an event_page at once."""
+        if doc['descriptor'] != self.desc:
+            return
+        self.flush_events()
+        self.add_page(doc)
+        for fit in self.fitPlots:
+            fit.event_page(doc)
+        self.request_redraw()
+
+    def flush_events(self):
+        """Packs the buffered events into an event_page and adds it."""
+        with self.pending_lock:
+            docs, self.pending_events = self.pending_events, []
+        if docs:
+            self.add_page(pack_event_page(*docs))
+
+    def add_page(self, doc):
+        """Adds the rows of the event_page `doc` to the data. Each
+        formula is evaluated only once over the arrays of the page."""
+        new_x = get_page_values(self.x, doc, self.eva)
         # Special-case 'time' to plot against against experiment epoch, not
         # UNIX epoch.
         if self.x == 'time' and self._epoch == 'run':
-            new_x -= self._epoch_offset
+            new_x = new_x - self._epoch_offset
+        new_y = {}
+        for y in self.ys:
+            new_y[y] = get_page_values(y, doc, self.eva)
+        self.update_caches_page(new_x, new_y)
 
-        self.update_caches(new_x, new_y)
-        for fit in self.fitPlots:
-            fit.event(doc)
+    def update_caches_page(self, x, ys):
+        if not self.is_scalar(self.x, x, 1):
+            return
+        for y in ys:
+            if self.is_scalar(y, ys[y], 1):
+                self.y_data[y].extend(ys[y])
+        self.x_data.extend(x)
+
+    def is_scalar(self, name, value, ndim):
+        """Whether `value` has `ndim` dimensions, i.e. is a scalar per
+        event (1 for the columns of an event_page). Non-scalar channels
+        (e.g. arrays of a buffered DAQ-input) cannot be stored in the
+        buffers, they are reported once and not plotted."""
+        if name in self.non_scalar:
+            return False
+        try:
+            shape = np.shape(value)
+        except ValueError:
+            shape = None
+        if shape is not None and len(shape) == ndim:
+            return True
+        self.non_scalar.add(name)
+        print(f'Cannot plot {name}: only scalar values can be plotted, '
+              f'got a value of shape {shape}.')
+        return False
+
+    def request_redraw(self):
+        """Redraws the plot if the last frame is at least 1 / `max_fps`
+        ago. Otherwise the redraw is coalesced into the next frame and
+        counted as dropped."""
+        self.redraw_pending = True
+        if self.max_fps and time.monotonic() - self.last_frame < 1 / self.max_fps:
+            self.dropped_frames += 1
+            return
         self.update_plot()
-        # super().event(doc)
 
-    def update_caches(self, x, ys):
-        for y in ys:
-            self.y_data[y].append(ys[y])
-        self.x_data.append(x)
+    def fit_updated(self):
+        """Called from the callback thread when a fit publishes a new
+        result (see `LiveFit_Eva.publish_pending`), it is drawn with the
+        next frame."""
+        self.fits_changed = True
+        self.redraw_pending = True
+
+    def render_pending(self):
+        """Draws the coalesced events, if there are any."""
+        if self.redraw_pending:
+            self.update_plot()
 
     def update_plot(self):
+        self.flush_events()
+        self.redraw_pending = False
+        self.last_frame = time.monotonic()
+        self.rendered_frames += 1
+        if self.fits_changed:
+            self.fits_changed = False
+            for fit in self.fitPlots:
+                fit.draw_fit()
         for y, line in self.current_lines.items():
-            xdat = np.abs(self.x_data) if self.use_abs['x'] else self.x_data
-            ydat = np.abs(self.y_data[y]) if self.use_abs['y'] else self.y_data[y]
+            xdat, ydat = self.get_draw_data(y)
+            if self.use_abs['x']:
+                xdat = np.abs(xdat)
+            if self.use_abs['y']:
+                ydat = np.abs(ydat)
             line.set_data(xdat, ydat)
         # Rescale and redraw.
         self.ax.relim(visible_only=True)
@@ -578,7 +951,55 @@ class MultiLivePlot(LivePlot, QObject):
         self.ax.figure.canvas.draw_idle()
         self.new_data.emit()
 
+    def get_draw_data(self, y):
+        """Returns the x- and y-data that is drawn for `y`. If there are
+        more points than pixels, this is the min/max-decimation of the
+        data, for a zoomed view the one of the visible range."""
+        n = min(len(self.x_data), len(self.y_data[y]))
+        xdat = self.x_data.data[:n]
+        ydat = self.y_data[y].data[:n]
+        n_pixels = max(int(self.ax.bbox.width), 1)
+        if not self.lod or n <= n_pixels:
+            return xdat, ydat
+        if self.max_points:
+            # the indices of the ring buffer shift, decimate all of it
+            indices = decimate(xdat, ydat, n_pixels)
+        else:
+            if y not in self.decimations:
+                self.decimations[y] = Min_Max_Decimation(n_pixels)
+            indices = self.decimations[y].update(xdat, ydat)
+            if y in self.zoom_indices:
+                zoom, n_zoom = self.zoom_indices[y]
+                indices = np.concatenate([zoom, indices[indices >= n_zoom]])
+        return xdat[indices], ydat[indices]
+
+    def xlim_changed(self, ax):
+        """Called when the x-limits change, e.g. when zooming with the
+        NavigationToolbar2QT. Decimates the visible range again with the
+        full resolution of the canvas. Points added later are drawn with
+        the normal decimation."""
+        if not self.lod or self.max_points:
+            return
+        if ax.get_autoscalex_on():
+            self.zoom_indices = {}
+            return
+        xmin, xmax = sorted(ax.get_xlim())
+        n_pixels = max(int(ax.bbox.width), 1)
+        self.zoom_indices = {}
+        for y in self.current_lines:
+            n = min(len(self.x_data), len(self.y_data[y]))
+            xdat = self.x_data.data[:n]
+            ydat = self.y_data[y].data[:n]
+            x_vis = np.abs(xdat) if self.use_abs['x'] else xdat
+            visible = np.nonzero((x_vis >= xmin) & (x_vis <= xmax))[0]
+            if len(visible) > n_pixels:
+                visible = visible[decimate(xdat[visible], ydat[visible],
+                                           n_pixels)]
+            self.zoom_indices[y] = (visible, n)
+        self.update_plot()
+
     def stop(self, doc):
+        self.render_pending()
         if not self.x_data:
             print('MultiLivePlot did not get any data that corresponds to the '
                   'x axis. {}'.format(self.x))
@@ -193,6 +193,15 @@ class Measurement_Protocol:
             total += step.time_weight
         return total
 
+    def get_step_info(self):
+        """Returns a dictionary with the info of all loop_steps (see
+        Loop_Step.get_step_info), used for the progress and ETA."""
+        self.get_used_devices()
+        info = {}
+        for step in self.loop_steps:
+            step.get_step_info(info)
+        return info
+
     def get_outer_string(self):
         outer_string = ''
         for step in self.loop_steps:
@@ -0,0 +1,59 @@
+import numpy as np
+
+from bluesky_handling.evaluation_helper import Evaluator
+
+
+def make_evaluator():
+    eva = Evaluator(namespace={'a': 2})
+    eva.event({'time': 1., 'data': {'x': 3.}})
+    return eva
+
+
+def test_comprehension_over_variable():
+    eva = make_evaluator()
+    assert eva.eval('[a*i for i in range(3)]') == [0, 2, 4]
+    assert eva.eval('tuple(x*i for i in range(3))') == (0., 3., 6.)
+
+
+def test_lambda_sees_variables():
+    eva = make_evaluator()
+    assert eva.eval('(lambda t: t*a)(3)') == 6
+    assert eva.eval('(lambda: np.sqrt(x))()') == np.sqrt(3.)
+
+
+def test_comprehension_in_page():
+    eva = Evaluator(namespace={'a': 2})
+    page = {'time': [1., 2.], 'data': {'x': [1., 2.]}}
+    values = eva.eval_page('[a*x for i in range(2)][-1]', page)
+    assert np.allclose(values, [2., 4.])
+
+
+def test_reduction_in_page_is_per_event():
+    eva = Evaluator(namespace={'a': 2})
+    page = {'time': [1., 2., 3.], 'data': {'x': [1., 2., 6.]}}
+    assert np.allclose(eva.eval_page('np.mean(x)', page), [1., 2., 6.])
+    assert np.allclose(eva.eval_page('np.max(x) - a', page), [-1., 0., 4.])
+
+
+def test_waveform_columns_in_page_are_evaluated_per_row():
+    eva = Evaluator()
+    page = {'time': [1., 2.], 'data': {'w': [[1., 3.], [5., 7.]]}}
+    assert np.allclose(eva.eval_page('np.mean(w)', page), [2., 6.])
+    assert np.allclose(eva.eval_page('len(w)', page), [2, 2])
+
+
+def test_vectorized_page_and_variables():
+    eva = Evaluator(namespace={'a': 2})
+    page = {'time': [1., 2.], 'data': {'x': [1., 2.]}}
+    assert np.allclose(eva.eval_page('a*x + 1', page), [3., 5.])
+    assert np.allclose(eva.eval_page('a + 1', page), [3., 3.])
+
+
+def test_cumulative_and_centered_formulas_in_page_are_per_event():
+    eva = Evaluator()
+    page = {'time': [1., 2., 3.], 'data': {'x': [1., 2., 3.]}}
+    # per event, np.cumsum gives an array with the single value
+    assert np.allclose(eva.eval_page('np.cumsum(x)', page), [[1.], [2.], [3.]])
+    assert np.allclose(eva.eval_page('x - np.mean(x)', page), [0., 0., 0.])
+    assert np.allclose(eva.eval_page('np.sin(x) * 2 > 1', page),
+                       np.sin([1., 2., 3.]) * 2 > 1)
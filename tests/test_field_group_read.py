@@ -0,0 +1,108 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('PyQt5')
+pytest.importorskip('bluesky_widgets')
+
+import bluesky.plan_stubs as bps
+from bluesky import RunEngine
+
+from utility import variables_handling
+from main_classes.measurement_channel import Measurement_Channel
+from loop_steps.read_channels import Read_Channels
+from bluesky_handling import helper_functions
+from bluesky_handling.special_plan_stubs import trigger_and_read_channels
+
+efs = sys.modules['bluesky_handling.EpicsFieldSignal']
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'devices', 'devices_drivers'))
+
+
+class Fake_PV:
+    connected = True
+
+    def __init__(self, name):
+        self.chid = name
+        self.pvname = name
+
+    def wait_for_connection(self, timeout=None):
+        return True
+
+
+class Fake_CA:
+    """Counts the round-trips: one per caget, one per batch of
+    non-waiting gets."""
+    def __init__(self):
+        self.round_trips = 0
+        self.outstanding = set()
+        self.pvs = {}
+
+    def get_pv(self, name, **kwargs):
+        return self.pvs.setdefault(name, Fake_PV(name))
+
+    def get(self, chid, wait=True):
+        self.outstanding.add(chid)
+
+    def get_complete(self, chid, timeout=None):
+        if self.outstanding:
+            self.round_trips += 1
+            self.outstanding.clear()
+        return 1.
+
+    def caget(self, name):
+        self.round_trips += 1
+        return 1.
+
+
+@pytest.fixture
+def fake_ca(monkeypatch):
+    fake = Fake_CA()
+    monkeypatch.setattr(efs, 'get_pv', fake.get_pv)
+    monkeypatch.setattr(efs, 'caget', fake.caget)
+    monkeypatch.setattr(efs.ca, 'get', fake.get)
+    monkeypatch.setattr(efs.ca, 'get_complete', fake.get_complete)
+    return fake
+
+
+def test_generated_read_channels_reads_fields_together(fake_ca, monkeypatch):
+    from PID_controller.PID_controller_ophyd import PID_Controller
+    pid = PID_Controller('ioc:pid:', name='pid', auto_pid=False)
+    fields = ['pid_kp', 'pid_ki', 'pid_kd', 'pid_pval', 'pid_ival']
+    channels = {f'pid_{field}': Measurement_Channel(f'pid.{field}', device='pid')
+                for field in fields}
+    monkeypatch.setattr(variables_handling, 'channels', channels)
+    step = Read_Channels(name='read', step_info={
+        'read_all': False,
+        'channel_dict': {name: {'read': True, 'use set': False}
+                         for name in channels}})
+    step.full_name = 'read'
+    code = 'def plan(devs, stream_name="primary"):\n'
+    code += step.get_protocol_string(1)
+    namespace = {'bps': bps, 'helper_functions': helper_functions,
+                 'trigger_and_read_channels': trigger_and_read_channels}
+    exec(code, namespace)
+
+    docs = []
+    RE = RunEngine({})
+    RE.subscribe(lambda name, doc: docs.append((name, doc)))
+
+    def run():
+        yield from bps.open_run()
+        for i in range(3):
+            yield from namespace['plan']({'pid': pid})
+        yield from bps.close_run()
+
+    fake_ca.round_trips = 0
+    RE(run())
+    events = [doc for name, doc in docs if name == 'event']
+    assert len(events) == 3
+    assert set(events[0]['data']) == {f'pid_{field}' for field in fields}
+    # one round-trip per event instead of one per field
+    assert fake_ca.round_trips == 3
+    assert pid._field_group_reader is None
+    # single gets outside of the read are not batched
+    fake_ca.round_trips = 0
+    pid.pid_kp.get()
+    assert fake_ca.round_trips == 1
@@ -0,0 +1,42 @@
+import h5py
+import pytest
+import bluesky.plan_stubs as bps
+from bluesky import RunEngine
+from bluesky.utils import RunEngineInterrupted
+from ophyd.sim import det
+
+from bluesky_handling.hdf5_writer import HDF5_Writer
+
+
+def plan_with_pause():
+    yield from bps.open_run()
+    for i in range(3):
+        yield from bps.trigger_and_read([det])
+    yield from bps.checkpoint()
+    yield from bps.pause()
+    for i in range(2):
+        yield from bps.trigger_and_read([det])
+    yield from bps.close_run()
+
+
+def test_events_after_pause_and_resume_are_written(tmp_path):
+    filename = str(tmp_path / 'run.h5')
+    RE = RunEngine({})
+    writer = HDF5_Writer(filename)
+    RE.subscribe(writer)
+    uids = []
+    RE.subscribe(lambda name, doc: uids.append(doc['uid']) if name == 'start' else None)
+    # the same as the main of the built protocols
+    with pytest.raises(RunEngineInterrupted):
+        try:
+            RE(plan_with_pause())
+        finally:
+            if RE.state != "paused":
+                writer.close()
+    assert RE.state == 'paused'
+    RE.resume()
+    assert writer.file is None
+    with h5py.File(filename, 'r') as file:
+        entry = file[uids[0]]
+        assert len(entry['primary/det']) == 5
+        assert entry['stop'].attrs['exit_status'] == 'success'
@@ -0,0 +1,47 @@
+import numpy as np
+import lmfit
+
+from utility.incremental_fit import get_polynomial_fit
+
+x0 = 1.7e9
+
+
+def add_in_pages(fit, x, y, page=7):
+    for i in range(0, len(x), page):
+        fit.add(x[i:i + page], y[i:i + page])
+
+
+def test_linear_fit_on_epoch_time_matches_lmfit():
+    rng = np.random.default_rng(0)
+    x = x0 + np.arange(200) * 0.5
+    y = 0.01 * (x - x0) + 3 + rng.normal(0, 0.05, len(x))
+    model = lmfit.models.LinearModel()
+    fit = get_polynomial_fit(model)
+    add_in_pages(fit, x, y)
+    result = fit.result()
+    reference = model.fit(y, model.guess(y, x=x), x=x)
+    assert np.isclose(result.best_values['slope'],
+                      reference.best_values['slope'], rtol=1e-6)
+    assert np.isclose(result.chisqr, reference.chisqr, rtol=1e-6)
+    assert np.allclose(result.eval(x=x), reference.eval(x=x), atol=1e-6)
+    assert np.allclose(np.sqrt(np.diag(result.covar)),
+                       np.sqrt(np.diag(reference.covar)), rtol=1e-3)
+
+
+def test_quadratic_fit_on_epoch_time_matches_shifted_lmfit():
+    rng = np.random.default_rng(1)
+    x = x0 + np.arange(300) * 0.1
+    t = x - x0
+    y = 1e-3 * t**2 - 0.02 * t + 1 + rng.normal(0, 0.05, len(x))
+    model = lmfit.models.QuadraticModel()
+    fit = get_polynomial_fit(model)
+    add_in_pages(fit, x, y)
+    result = fit.result()
+    # lmfit itself is only accurate on the shifted x
+    reference = model.fit(y, model.guess(y, x=t), x=t)
+    assert np.isclose(result.best_values['a'], reference.best_values['a'],
+                      rtol=1e-5)
+    a = reference.best_values['a']
+    b = reference.best_values['b'] - 2 * a * x0
+    assert np.isclose(result.best_values['b'], b, rtol=1e-5)
+    assert np.isclose(result.chisqr, reference.chisqr, rtol=1e-5)
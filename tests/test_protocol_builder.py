@@ -0,0 +1,32 @@
+import os
+import importlib.util
+
+import pytest
+
+pytest.importorskip('PyQt5')
+pytest.importorskip('bluesky_widgets')
+
+from utility import variables_handling
+from main_classes.protocol_class import Measurement_Protocol
+from loop_steps.for_while_loops import For_Loop_Step
+from bluesky_handling import protocol_builder
+
+
+def test_unchanged_protocol_is_not_rebuilt_or_recompiled(tmp_path):
+    variables_handling.devices = {}
+    protocol = Measurement_Protocol(name='test')
+    protocol.add_loop_step(For_Loop_Step(name='loop'))
+    file_path = str(tmp_path / 'test.py')
+    assert protocol_builder.build_protocol(protocol, file_path)
+    cfile = importlib.util.cache_from_source(file_path)
+    assert os.path.isfile(cfile)
+    mtime = os.stat(file_path).st_mtime_ns
+    cmtime = os.stat(cfile).st_mtime_ns
+
+    assert not protocol_builder.build_protocol(protocol, file_path)
+    assert os.stat(file_path).st_mtime_ns == mtime
+    assert os.stat(cfile).st_mtime_ns == cmtime
+
+    os.remove(cfile)
+    assert not protocol_builder.build_protocol(protocol, file_path)
+    assert os.path.isfile(cfile)
@@ -0,0 +1,19 @@
+from bluesky_handling.run_index import Run_Index
+
+userdata = {'Name': 'Jane Doe', 'E-Mail': 'jane@example.org',
+            'Affiliation': 'University', 'Address (affiliation)': 'Street 1',
+            'ORCID': '', 'Phone': ''}
+sampledata = {'Name': 'Sample A', 'Identifier': 'A-1',
+              'Preparation-Info': 'cleaned'}
+
+
+def test_search_by_user_and_sample(tmp_path):
+    index = Run_Index(str(tmp_path / 'index.sqlite'))
+    index.add_start({'uid': 'abc', 'time': 1., 'user': userdata,
+                     'sample': sampledata, 'protocol': 'prot'})
+    index.add_start({'uid': 'def', 'time': 2.,
+                     'user': {'name': 'default_user'}, 'sample': {}})
+    runs = index.search(user='Jane Doe', sample='Sample A')
+    assert [run['uid'] for run in runs] == ['abc']
+    assert [run['uid'] for run in index.search(user='default_user')] == ['def']
+    index.close()
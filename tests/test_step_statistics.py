@@ -0,0 +1,29 @@
+from utility.step_statistics import Progress_Estimator
+
+
+def get_estimator():
+    info = {'a': {'step_type': 'Read Channels', 'devices': [], 'count': 3,
+                  'units': 1}}
+    estimator = Progress_Estimator('test', info)
+    estimator.start(0)
+    return estimator
+
+
+def test_paused_time_is_not_counted():
+    estimator = get_estimator()
+    estimator.step_started('a', 0)
+    estimator.pause(1)
+    estimator.resume(11)
+    estimator.step_started('a', 12)
+    assert estimator.durations['a'] == [2]
+    # still paused at the end of the step
+    estimator.pause(13)
+    estimator.step_started('a', 20)
+    assert estimator.durations['a'] == [2, 1]
+    assert estimator.get_remaining(20) == 1.5
+    # the pause goes on, the remaining time does not change
+    assert estimator.get_remaining(24) == 1.5
+    estimator.resume(25)
+    assert estimator.get_remaining(26) == 0.5
+    percent, remaining = estimator.get_progress(26)
+    assert percent == int(4 / 4.5 * 100)
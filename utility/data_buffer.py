@@ -0,0 +1,155 @@
+import numpy as np
+
+
+class Data_Buffer:
+    """A numpy-buffer for live-plot data, that grows by doubling its
+    capacity (amortized O(1) per appended point). If `max_points` is
+    given, it works as a ring buffer only keeping the last `max_points`
+    values (e.g. for strip-chart plots).
+
+    In ring mode every value is written twice (at i and i+max_points),
+    so that the current content is always one contiguous slice.
+    `data` always returns a view of the buffer, no copy is made."""
+    def __init__(self, capacity=1024, max_points=None, dtype=float):
+        self.max_points = max_points
+        self.dtype = dtype
+        if max_points:
+            self.buffer = np.empty(2 * max_points, dtype=dtype)
+        else:
+            self.buffer = np.empty(capacity, dtype=dtype)
+        self.n = 0
+        self.head = 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def data(self):
+        """View of the currently stored values in the order they were
+        added."""
+        if self.max_points:
+            if self.n < self.max_points:
+                return self.buffer[:self.n]
+            return self.buffer[self.head:self.head + self.max_points]
+        return self.buffer[:self.n]
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.data
+        return self.data.astype(dtype)
+
+    def append(self, value):
+        if self.max_points:
+            self.buffer[self.head] = value
+            self.buffer[self.head + self.max_points] = value
+            self.head = (self.head + 1) % self.max_points
+            self.n = min(self.n + 1, self.max_points)
+            return
+        if self.n == len(self.buffer):
+            self.grow(self.n + 1)
+        self.buffer[self.n] = value
+        self.n += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.dtype).ravel()
+        k = len(values)
+        if not k:
+            return
+        if self.max_points:
+            if k >= self.max_points:
+                values = values[-self.max_points:]
+                self.buffer[:self.max_points] = values
+                self.buffer[self.max_points:] = values
+                self.head = 0
+                self.n = self.max_points
+                return
+            index = (self.head + np.arange(k)) % self.max_points
+            self.buffer[index] = values
+            self.buffer[index + self.max_points] = values
+            self.head = (self.head + k) % self.max_points
+            self.n = min(self.n + k, self.max_points)
+            return
+        if self.n + k > len(self.buffer):
+            self.grow(self.n + k)
+        self.buffer[self.n:self.n + k] = values
+        self.n += k
+
+    def grow(self, min_capacity):
+        """Doubles the capacity until `min_capacity` fits."""
+        capacity = max(len(self.buffer), 1)
+        while capacity < min_capacity:
+            capacity *= 2
+        new_buffer = np.empty(capacity, dtype=self.dtype)
+        new_buffer[:self.n] = self.buffer[:self.n]
+        self.buffer = new_buffer
+
+    def clear(self):
+        self.n = 0
+        self.head = 0
+
+
+class Min_Max_Decimation:
+    """Incremental min/max-decimation of a line for drawing.
+
+    The points are split into buckets of `bucket_size` consecutive
+    points. Of each bucket only the points with the minimum / maximum
+    of x and y and the minimum of abs(x) and abs(y) are kept, so the
+    drawn envelope and the data-limits (also for log-plots of the
+    absolute values) are the same as for the full data. If there are
+    more than 2 * `n_buckets` buckets, neighbouring buckets are merged,
+    which only needs the already kept points.
+    """
+    n_extremes = 6
+
+    def __init__(self, n_buckets=1000):
+        self.n_buckets = max(int(n_buckets), 1)
+        self.bucket_size = 1
+        self.kept = np.empty((0, self.n_extremes), dtype=int)
+        self.n_done = 0
+
+    def update(self, x, y):
+        """Reduces all complete buckets of the points that were added
+        since the last call. Returns the indices of the points to draw."""
+        n = len(y)
+        k = (n - self.n_done) // self.bucket_size
+        if k:
+            stop = self.n_done + k * self.bucket_size
+            idx = np.arange(self.n_done, stop).reshape(k, self.bucket_size)
+            self.kept = np.concatenate([self.kept, extreme_indices(x, y, idx)])
+            self.n_done = stop
+        while len(self.kept) > 2 * self.n_buckets:
+            self.merge(x, y)
+        return np.concatenate([np.unique(self.kept),
+                               np.arange(self.n_done, n)])
+
+    def merge(self, x, y):
+        """Doubles the bucket size by merging neighbouring buckets."""
+        n_pairs = len(self.kept) // 2
+        pairs = self.kept[:2 * n_pairs].reshape(n_pairs, 2 * self.n_extremes)
+        merged = extreme_indices(x, y, pairs)
+        self.kept = np.concatenate([merged, self.kept[2 * n_pairs:]])
+        self.bucket_size *= 2
+
+    def reset(self):
+        self.bucket_size = 1
+        self.kept = np.empty((0, self.n_extremes), dtype=int)
+        self.n_done = 0
+
+
+def extreme_indices(x, y, idx):
+    """For each row of indices `idx`, returns the sorted indices of the
+    points with min / max of x and y and min of abs(x) and abs(y)."""
+    xs = x[idx]
+    ys = y[idx]
+    pick = np.stack([xs.argmin(axis=1), xs.argmax(axis=1),
+                     np.abs(xs).argmin(axis=1), ys.argmin(axis=1),
+                     ys.argmax(axis=1), np.abs(ys).argmin(axis=1)], axis=1)
+    kept = np.take_along_axis(idx, pick, axis=1)
+    kept.sort(axis=1)
+    return kept
+
+
+def decimate(x, y, n_buckets=1000):
+    """Returns the indices of the min/max-decimation of the whole line,
+    see `Min_Max_Decimation`."""
+    return Min_Max_Decimation(n_buckets).update(x, y)
@@ -1,7 +1,9 @@
 import os.path
+import json
 
-import databroker
 import h5py
+import numpy as np
+from event_model import pack_event_page
 from datetime import datetime as dt
 
 import xarray
@@ -11,9 +13,9 @@ def recourse_entry_dict(entry, metadata):
     """Recoursively makes the metadata to a dictionary."""
     # TODO check if actually necessary
     for key, val in metadata.items():
-        if isinstance(val, databroker.core.Start) or isinstance(val, databroker.core.Stop):
+        if isinstance(val, dict):
+            # also the Start- / Stop-documents of databroker
             val = dict(val)
-        if type(val) is dict:
             sub_entry = entry.create_group(key)
             recourse_entry_dict(sub_entry, val)
         elif type(val) is list:
@@ -21,48 +23,319 @@ def recourse_entry_dict(entry, metadata):
                 if isinstance(value, dict):
                     sub_entry = entry.create_group(f'{key}_{i}')
                     recourse_entry_dict(sub_entry, value)
+                elif isinstance(value, (list, tuple)):
+                    # e.g. the hints' dimensions, possibly ragged
+                    entry.attrs[f'{key}_{i}'] = str(value)
                 else:
-                    entry.attrs[f'{key}_{i}'] = val
+                    entry.attrs[f'{key}_{i}'] = value
         elif val is None:
             continue
         else:
             entry.attrs[key] = val
 
-def broker_to_hdf5(runs, filename, additional_data=None):
+def broker_to_hdf5(runs, filename, additional_data=None, chunk_size=None,
+                   compression='gzip', compression_opts=4,
+                   max_buffer_bytes=2**24):
     """Puts the given `runs` into `filename`, containing the run's
-    metadata and the dataset."""
-    if not os.path.isdir(os.path.dirname(filename)):
+    metadata and the dataset.
+
+    The file is opened only once for all runs. The events are read from
+    the run's documents and appended to chunked datasets whenever
+    `max_buffer_bytes` are collected, so the whole streams never have to
+    be in memory at once.
+
+    Parameters
+    ----------
+    runs : BlueskyRun or list of BlueskyRun
+        The runs to export.
+    filename : str, path
+        The HDF5 file, it is created if it does not exist.
+    additional_data : dict, default None
+        Further metadata written into each run's group.
+    chunk_size : int, default None
+        The number of rows per chunk of the datasets. If None, the rows
+        of about 64 KiB of data are used.
+    compression : str, default "gzip"
+        "gzip", "lzf" or None, see h5py.
+    compression_opts : int, default 4
+        The level for gzip-compression.
+    max_buffer_bytes : int, default 16 MiB
+        Size of the buffered events of a stream, before they are written.
+    """
+    if os.path.dirname(filename) and not os.path.isdir(os.path.dirname(filename)):
         os.makedirs(os.path.dirname(filename))
     if not isinstance(runs, list):
         runs = [runs]
-    for run in runs:
-        metadata = run.metadata
-        with h5py.File(filename, 'a') as file:
+    if compression != 'gzip':
+        compression_opts = None
+    additional_data = additional_data or {}
+    with h5py.File(filename, 'a') as file:
+        for run in runs:
             entry = file.create_group(run.name)
-            for stream in run:
-                dataset = run[stream].read()
-                group = entry.create_group(stream)
-                for col in dataset:
-                    group[col] = dataset[col]
-                for coord in dataset.coords:
-                    group[coord] = dataset[coord]
-            recourse_entry_dict(entry, metadata)
-            additional_data = additional_data or {}
+            streams = {}
+            descriptors = {}
+            for name, doc in run.documents(fill='yes'):
+                if name == 'descriptor':
+                    stream_name = doc.get('name', 'primary')
+                    if stream_name not in streams:
+                        streams[stream_name] = Stream_Writer(entry.create_group(stream_name),
+                                                             chunk_size, compression,
+                                                             compression_opts)
+                    streams[stream_name].add_data_keys(doc['data_keys'])
+                    descriptors[doc['uid']] = streams[stream_name]
+                elif name in ('event', 'event_page'):
+                    if name == 'event':
+                        doc = pack_event_page(doc)
+                    stream = descriptors[doc['descriptor']]
+                    stream.buffer_page(doc)
+                    if stream.buffered_bytes() >= max_buffer_bytes:
+                        stream.write()
+            for stream in streams.values():
+                stream.write()
+            recourse_entry_dict(entry, run.metadata)
             recourse_entry_dict(entry, additional_data)
 
 
+class Stream_Writer:
+    """Buffers the events of one stream and appends them to the
+    resizable, chunked datasets (one per data-key and "time") in
+    `group`.
+
+    Parameters
+    ----------
+    group : h5py.Group
+        The group of the stream.
+    chunk_size : int, default None
+        Rows per chunk, if None, as many rows as fit into `chunk_bytes`.
+    compression : str, default None
+        "gzip", "lzf" or None, see h5py.
+    compression_opts : int, default None
+        The level for gzip-compression.
+    """
+    chunk_bytes = 2**16
+
+    def __init__(self, group, chunk_size=None, compression=None,
+                 compression_opts=None):
+        self.group = group
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.data_keys = {}
+        self.buffer = []
+        self.n_buffered = 0
+        self.row_bytes = 8
+        self.skipped = set()
+
+    def add_data_keys(self, data_keys, skip_external=False):
+        """Adds the data-keys of a descriptor. If `skip_external`, keys
+        referring to external data (not filled into the events) are
+        left out."""
+        for key, info in data_keys.items():
+            if skip_external and info.get('external'):
+                if key not in self.skipped:
+                    print(f'skipping external data {key}')
+                    self.skipped.add(key)
+                continue
+            self.data_keys[key] = info
+        self.row_bytes = 8 + sum(8 * max(int(np.prod(info.get('shape') or [])), 1)
+                                 for info in self.data_keys.values())
+
+    def buffer_page(self, page):
+        self.buffer.append(page)
+        self.n_buffered += len(page['time'])
+
+    def buffered_bytes(self):
+        """Estimate of the size of the buffered events."""
+        return self.n_buffered * self.row_bytes
+
+    def write(self):
+        """Appends the buffered events to the datasets."""
+        if not self.buffer:
+            return
+        pages, self.buffer = self.buffer, []
+        self.n_buffered = 0
+        columns = {'time': np.concatenate([np.asarray(page['time'])
+                                           for page in pages])}
+        for key in self.data_keys:
+            if key in self.skipped:
+                continue
+            try:
+                columns[key] = np.concatenate([np.asarray(page['data'][key])
+                                               for page in pages])
+            except (KeyError, ValueError) as e:
+                print(f'could not write {key}: {e}')
+                self.skipped.add(key)
+        for key, values in columns.items():
+            try:
+                self.append(key, values)
+            except (TypeError, ValueError) as e:
+                print(f'could not write {key}: {e}')
+                self.skipped.add(key)
+
+    def append(self, key, values):
+        if values.dtype.kind in 'OUS':
+            values = values.astype(str).astype(object)
+            dtype = h5py.string_dtype()
+        else:
+            dtype = values.dtype
+        if key not in self.group:
+            shape = values.shape[1:]
+            chunk_rows = self.chunk_size
+            if not chunk_rows:
+                row_bytes = max(int(np.prod(shape)), 1) * np.dtype(dtype).itemsize
+                chunk_rows = max(1, min(1024, self.chunk_bytes // row_bytes))
+            self.group.create_dataset(key, shape=(0,) + shape, dtype=dtype,
+                                      maxshape=(None,) + shape,
+                                      chunks=(int(chunk_rows),) + shape,
+                                      compression=self.compression,
+                                      compression_opts=self.compression_opts)
+        dataset = self.group[key]
+        n = dataset.shape[0]
+        dataset.resize(n + len(values), axis=0)
+        dataset[n:] = values
+
+
+def broker_to_zarr(runs, directory, chunk_size=2**16):
+    """Exports the scalar data of the given `runs` column-wise into Zarr
+    stores, one per stream: "<directory>/<uid>/<stream>.zarr" with one
+    chunked array per data-key along the dimension "time". The run's
+    metadata is written as "<directory>/<uid>/metadata.json".
+
+    Since every column is stored separately, reading some columns only
+    reads their chunks, see `open_zarr_stream`. Non-scalar data-keys
+    (arrays, images) are left out.
+
+    Parameters
+    ----------
+    runs : BlueskyRun or list of BlueskyRun
+        The runs to export.
+    directory : str, path
+        The directory for the stores, existing stores are overwritten.
+    chunk_size : int, default 65536
+        The number of rows per chunk, also the number of events
+        buffered before they are written.
+    """
+    if not isinstance(runs, list):
+        runs = [runs]
+    for run in runs:
+        run_dir = f'{directory}/{run.name}'
+        if not os.path.isdir(run_dir):
+            os.makedirs(run_dir)
+        streams = {}
+        descriptors = {}
+        for name, doc in run.documents(fill='yes'):
+            if name == 'descriptor':
+                stream_name = doc.get('name', 'primary')
+                if stream_name not in streams:
+                    streams[stream_name] = Zarr_Stream_Writer(f'{run_dir}/{stream_name}.zarr',
+                                                              chunk_size)
+                streams[stream_name].add_data_keys(doc['data_keys'])
+                descriptors[doc['uid']] = streams[stream_name]
+            elif name in ('event', 'event_page'):
+                if name == 'event':
+                    doc = pack_event_page(doc)
+                stream = descriptors[doc['descriptor']]
+                stream.buffer_page(doc)
+                if stream.n_buffered >= chunk_size:
+                    stream.write()
+        for stream in streams.values():
+            stream.write(final=True)
+        metadata = {key: dict(val) for key, val in run.metadata.items()
+                    if val is not None}
+        with open(f'{run_dir}/metadata.json', 'w') as file:
+            json.dump(metadata, file, indent=2, default=str)
+
+def open_zarr_stream(path, columns=None, chunks=None):
+    """Opens a stream exported by `broker_to_zarr` lazily as
+    xarray.Dataset, only the data of the selected `columns` is read
+    when it is accessed. Give `chunks` (e.g. {}) to get dask arrays."""
+    dataset = xarray.open_zarr(path, chunks=chunks)
+    if columns is not None:
+        dataset = dataset[columns]
+    return dataset
+
+
+class Zarr_Stream_Writer:
+    """Buffers the scalar columns of one stream and appends them to the
+    Zarr store at `path`, in blocks of whole chunks."""
+    def __init__(self, path, chunk_size=2**16):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.data_keys = {}
+        self.skipped = set()
+        self.buffer = []
+        self.n_buffered = 0
+        self.created = False
+
+    def add_data_keys(self, data_keys):
+        for key, info in data_keys.items():
+            if info.get('shape') or info.get('external'):
+                if key not in self.skipped:
+                    print(f'skipping non-scalar data {key}')
+                    self.skipped.add(key)
+                continue
+            self.data_keys[key] = info
+
+    def buffer_page(self, page):
+        self.buffer.append(page)
+        self.n_buffered += len(page['time'])
+
+    def write(self, final=False):
+        """Writes the buffered rows, as multiple of `chunk_size` unless
+        `final`, so the appended chunks stay aligned."""
+        if not self.buffer:
+            return
+        time = np.concatenate([np.asarray(page['time']) for page in self.buffer])
+        columns = {}
+        for key in self.data_keys:
+            if key in self.skipped:
+                continue
+            try:
+                values = np.concatenate([np.asarray(page['data'][key])
+                                         for page in self.buffer])
+            except (KeyError, ValueError):
+                values = None
+            if values is None or values.ndim != 1:
+                # the columns of all blocks have to be the same
+                print(f'could not write {key}')
+                self.skipped.add(key)
+                continue
+            if values.dtype.kind in 'OUS':
+                values = values.astype(str).astype(object)
+            columns[key] = values
+        n = len(time) if final else len(time) // self.chunk_size * self.chunk_size
+        if not n:
+            return
+        self.buffer = []
+        self.n_buffered = len(time) - n
+        if self.n_buffered:
+            rest = {'time': time[n:], 'data': {key: values[n:] for key, values in columns.items()}}
+            self.buffer.append(rest)
+        dataset = xarray.Dataset({key: ('time', values[:n])
+                                  for key, values in columns.items()},
+                                 coords={'time': time[:n]})
+        if self.created:
+            dataset.to_zarr(self.path, append_dim='time')
+        else:
+            encoding = {key: {'chunks': (self.chunk_size,)}
+                        for key in list(columns) + ['time']}
+            dataset.to_zarr(self.path, mode='w', encoding=encoding)
+            self.created = True
+
 
 def broker_to_dict(runs, to_iso_time=False):
-    """Puts the runs into a dictionary."""
+    """Puts the runs into a dictionary, the data of each stream is
+    under its name in "data"."""
     dicts = []
     if not isinstance(runs, list):
         runs = [runs]
     for run in runs:
         data = {}
         for stream in run:
-            data = run[stream].read()
-            if isinstance(data, xarray.Dataset):
-                data = data.to_array()
+            stream_data = run[stream].read()
+            if isinstance(stream_data, xarray.Dataset):
+                stream_data = stream_data.to_array()
+            data[stream] = stream_data
         rundict = {'metadata_start': dict(run.metadata['start']),
                    'metadata_stop': dict(run.metadata['stop']),
                    'data': data}
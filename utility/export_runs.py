@@ -0,0 +1,137 @@
+"""Exports runs of a CAMELS catalog to HDF5 / NeXus files.
+
+The runs are selected through the run index (see
+bluesky_handling.run_index) by date range, user, sample and protocol,
+each run is exported into its own file by a pool of worker processes.
+
+Example:
+    python utility/export_runs.py out_dir --since 2023-01-01 --user Name --format nexus
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bluesky_handling import run_index
+
+
+def get_timestamp(date):
+    """Converts an ISO-date (e.g. "2023-05-17" or "2023-05-17T12:00")
+    to a timestamp, None stays None."""
+    if date is None:
+        return None
+    return datetime.fromisoformat(date).timestamp()
+
+def get_end_timestamp(date):
+    """Like `get_timestamp`, but a date without time gives the
+    midnight after it, so the whole day is included when used as
+    exclusive end."""
+    if date is None:
+        return None
+    end = datetime.fromisoformat(date)
+    if 'T' not in date and ' ' not in date.strip():
+        end += timedelta(days=1)
+    return end.timestamp()
+
+def get_export_name(run, file_format):
+    """The file name for `run` (a row of the index): start time,
+    protocol and the beginning of the uid."""
+    stamp = datetime.fromtimestamp(run['time']).strftime('%Y-%m-%d_%H-%M-%S')
+    ending = 'nxs' if file_format == 'nexus' else 'h5'
+    return f'{stamp}_{run["protocol"] or "run"}_{run["uid"][:8]}.{ending}'
+
+def export_run(path, uid, filename, file_format='hdf5', nexus_mapper=None):
+    """Exports the run `uid` of the msgpack file `path` into `filename`.
+    Runs in the worker processes, returns the size of the file."""
+    from utility.databroker_export import broker_to_hdf5
+    from bluesky_handling.nexus_writer import NeXus_Writer
+    run = run_index.open_run_file(path, uid)
+    if os.path.isfile(filename):
+        os.remove(filename)
+    if file_format == 'nexus':
+        writer = NeXus_Writer(filename, nexus_mapper)
+        for name, doc in run.documents(fill='yes'):
+            writer(name, doc)
+        writer.close()
+    else:
+        broker_to_hdf5(run, filename)
+    return os.path.getsize(filename)
+
+def export_runs(runs, out_dir, file_format='hdf5', nexus_mapper=None,
+                workers=None):
+    """Exports the `runs` (rows of the run index) into `out_dir` using
+    `workers` processes (default: number of CPUs), printing the
+    progress. Returns the list of files that were written."""
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    if file_format == 'nexus' and nexus_mapper is None:
+        from bluesky_handling.nexus_writer import standard_nexus_dict
+        nexus_mapper = standard_nexus_dict
+    n = len(runs)
+    written = []
+    total_bytes = 0
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for run in runs:
+            filename = f'{out_dir}/{get_export_name(run, file_format)}'
+            future = pool.submit(export_run, run['path'], run['uid'],
+                                 filename, file_format, nexus_mapper)
+            futures[future] = (run['uid'], filename)
+        for i, future in enumerate(as_completed(futures)):
+            uid, filename = futures[future]
+            try:
+                total_bytes += future.result()
+                written.append(filename)
+                result = os.path.basename(filename)
+            except Exception as e:
+                result = f'failed: {e!r}'
+            elapsed = time.time() - start
+            print(f'[{i+1}/{n}] {uid[:8]} {result} - '
+                  f'{(i+1) / elapsed:.2f} runs/s, '
+                  f'{total_bytes / elapsed / 2**20:.1f} MiB/s')
+    print(f'exported {len(written)} of {n} runs in {time.time() - start:.1f} s')
+    return written
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Export runs of a CAMELS catalog to HDF5 / NeXus.')
+    parser.add_argument('out_dir', help='directory for the exported files')
+    parser.add_argument('--catalog', default='CAMELS_CATALOG')
+    parser.add_argument('--since', help='start date (ISO format, e.g. 2023-01-31)')
+    parser.add_argument('--until', help='end date (ISO format), a date without time includes the whole day, a time is exclusive')
+    parser.add_argument('--user')
+    parser.add_argument('--sample')
+    parser.add_argument('--protocol')
+    parser.add_argument('--format', choices=['hdf5', 'nexus'], default='hdf5')
+    parser.add_argument('--mapper', help='json-file with the NeXus-paths, instead of the standard ones')
+    parser.add_argument('--workers', type=int, help='number of processes (default: number of CPUs)')
+    args = parser.parse_args(args)
+
+    broker_path = run_index.get_broker_path(args.catalog)
+    if broker_path is None:
+        print(f'catalog {args.catalog} not found')
+        return 1
+    index = run_index.Run_Index(f'{broker_path}/{run_index.index_filename}')
+    index.update_from_files(broker_path)
+    runs = index.search(user=args.user, sample=args.sample,
+                        protocol=args.protocol,
+                        since=get_timestamp(args.since),
+                        before=get_end_timestamp(args.until))
+    index.close()
+    runs = [run for run in runs if run['path']]
+    print(f'found {len(runs)} runs')
+    nexus_mapper = None
+    if args.mapper:
+        with open(args.mapper, 'r') as file:
+            nexus_mapper = json.load(file)
+    export_runs(runs, args.out_dir, args.format, nexus_mapper, args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
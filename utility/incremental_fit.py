@@ -0,0 +1,164 @@
+from math import comb
+
+import numpy as np
+from lmfit import models
+
+from utility.data_buffer import Data_Buffer
+
+
+class Least_Squares_Result:
+    """Minimal replacement of lmfit's ModelResult for the closed-form
+    fits, providing the attributes used by the live fits and plots."""
+    def __init__(self, model, best_values, covar, chisqr, ndata):
+        self.model = model
+        self.best_values = best_values
+        self.values = best_values
+        self.init_values = {}
+        self.covar = covar
+        self.var_names = list(model.param_names)
+        self.chisqr = chisqr
+        self.ndata = ndata
+
+    def eval(self, **kwargs):
+        values = dict(self.best_values)
+        values.update(kwargs)
+        return self.model.eval(**values)
+
+
+class Polynomial_Least_Squares:
+    """Closed-form least squares for linear and polynomial models.
+
+    Instead of fitting all the data again, the running sums of the
+    normal equations (the Gram matrix of the Vandermonde rows, their
+    product with y and the sum of y^2) are updated with each new point,
+    so a new result only costs solving a (degree+1)-sized system.
+
+    The sums are not built from the raw x (e.g. epoch timestamps around
+    1.7e9, which would make the normal equations useless), but from
+    t = (x - x_0) / scale, with the first x as offset and the span of
+    the data as scale. y is shifted by its first value. The points are
+    kept, so the sums can be rebuilt whenever the span grew by more than
+    a factor of two. The coefficients and the covariance are transformed
+    back to the parameters of the model in `result`.
+
+    Parameters
+    ----------
+    model : lmfit.Model
+        The used model, only needed for the result.
+    powers : dict
+        Maps the parameter names of the model to the power of x they
+        belong to.
+    """
+    def __init__(self, model, powers):
+        self.model = model
+        self.powers = powers
+        self.degree = max(powers.values())
+        # order of the parameters as lmfit uses it (e.g. for covar)
+        self.order = [powers[name] for name in model.param_names]
+        self.reset()
+
+    def reset(self):
+        p = self.degree + 1
+        self.gram = np.zeros((p, p))
+        self.xty = np.zeros(p)
+        self.yy = 0.
+        self.n = 0
+        self.x_offset = None
+        self.y_offset = 0.
+        self.scale = None
+        self.x_data = Data_Buffer()
+        self.y_data = Data_Buffer()
+
+    def add(self, x, y):
+        x = np.atleast_1d(np.asarray(x, dtype=float)).ravel()
+        y = np.atleast_1d(np.asarray(y, dtype=float)).ravel()
+        if not len(x):
+            return
+        if self.x_offset is None:
+            self.x_offset = x[0]
+            self.y_offset = y[0]
+        self.x_data.extend(x)
+        self.y_data.extend(y)
+        span = np.max(np.abs(x - self.x_offset))
+        if span > 0 and (self.scale is None or span > 2 * self.scale):
+            self.scale = span
+            self.rebuild()
+        else:
+            self.add_sums(x, y)
+
+    def add_sums(self, x, y):
+        vander = np.vander((x - self.x_offset) / (self.scale or 1.),
+                           self.degree + 1, increasing=True)
+        y = y - self.y_offset
+        self.gram += vander.T @ vander
+        self.xty += vander.T @ y
+        self.yy += y @ y
+        self.n += len(y)
+
+    def rebuild(self):
+        """Builds the sums again from all points with the current
+        scale."""
+        p = self.degree + 1
+        self.gram = np.zeros((p, p))
+        self.xty = np.zeros(p)
+        self.yy = 0.
+        self.n = 0
+        self.add_sums(self.x_data.data, self.y_data.data)
+
+    def transformation(self):
+        """The matrix mapping the coefficients of the powers of t to
+        those of the powers of x (without the y-offset)."""
+        p = self.degree + 1
+        scale = self.scale or 1.
+        trafo = np.zeros((p, p))
+        for k in range(p):
+            for j in range(k + 1):
+                trafo[j, k] = comb(k, j) * (-self.x_offset)**(k - j) / scale**k
+        return trafo
+
+    def result(self):
+        """Returns the current Least_Squares_Result, None if there are
+        not enough points yet."""
+        p = self.degree + 1
+        if self.n < p:
+            return None
+        coeffs = np.linalg.lstsq(self.gram, self.xty, rcond=None)[0]
+        chisqr = max(self.yy - 2 * coeffs @ self.xty
+                     + coeffs @ self.gram @ coeffs, 0.)
+        trafo = self.transformation()
+        raw_coeffs = trafo @ coeffs
+        raw_coeffs[0] += self.y_offset
+        covar = None
+        if self.n > p:
+            try:
+                covar = chisqr / (self.n - p) * np.linalg.inv(self.gram)
+                covar = trafo @ covar @ trafo.T
+                covar = covar[np.ix_(self.order, self.order)]
+            except np.linalg.LinAlgError:
+                covar = None
+        best_values = {name: float(raw_coeffs[power])
+                       for name, power in self.powers.items()}
+        return Least_Squares_Result(self.model, best_values, covar, chisqr,
+                                    self.n)
+
+
+def get_polynomial_fit(model, params=None):
+    """Returns a Polynomial_Least_Squares for linear, quadratic and
+    polynomial models from lmfit, if none of the parameters is bounded,
+    fixed or constrained. Otherwise returns None."""
+    if params:
+        for par in params.values():
+            if (not par.vary or par.expr or np.isfinite(par.min)
+                    or np.isfinite(par.max)):
+                return None
+    prefix = model.prefix
+    if isinstance(model, models.LinearModel):
+        powers = {'intercept': 0, 'slope': 1}
+    elif isinstance(model, models.QuadraticModel):
+        powers = {'c': 0, 'b': 1, 'a': 2}
+    elif isinstance(model, models.PolynomialModel):
+        powers = {f'c{i}': i for i in range(model.poly_degree + 1)}
+    else:
+        return None
+    powers = {f'{prefix}{name}': power for name, power in powers.items()}
+    return Polynomial_Least_Squares(model, powers)
@@ -1,7 +1,8 @@
-import signal
 import os
+import sys
+import threading
+import time
 
-import numpy as np
 
 from PyQt5.QtCore import QThread, pyqtSignal
 
@@ -9,6 +10,7 @@ import subprocess
 
 from EPICS_handling import make_ioc
 from utility import variables_handling
+from bluesky_handling.protocol_runner import read_message, write_message
 
 
 class Make_Ioc(QThread):
@@ -49,10 +51,19 @@ class Make_Ioc(QThread):
 
 
 class Run_Protocol(QThread):
-    """Runs the given protocol with a file at the given path."""
+    """Runs a protocol in a separate process (see
+    bluesky_handling.protocol_runner), started when the thread starts,
+    so the imports are already done when the protocol is run. The
+    messages of the process are turned into the signals.
+
+    The time to the first event is reported for the run, together with
+    the startup time of the runner, which a cold start would add."""
     sig_step = pyqtSignal(int)
     info_step = pyqtSignal(str)
     protocol_done = pyqtSignal()
+    ready = pyqtSignal()
+    step_started = pyqtSignal(str)
+    run_ended = pyqtSignal(bool)
 
     def __init__(self):
         super().__init__()
@@ -60,81 +71,137 @@ class Run_Protocol(QThread):
         self.path = None
         self.popen = None
         self.current_protocol = None
-        self.total_time = np.inf
-        self.counter = 0
         self.paused = False
         self.already_run = False
+        self.send_lock = threading.Lock()
+        self.pending_messages = []
+        self.spawn_time = None
+        self.startup_time = None
+        self.run_time = None
+        self.first_event_time = None
 
     def run(self) -> None:
-        """Runs the given `protocol` at `file_path`. If `sig_step` is
-        provided, the stdout will be written there. If `info_step` is
-        provided, it will update the completed-percentage with each starting
-        loopstep."""
-        args = []
+        """Starts the runner-process and handles its messages until it
+        exits. Each starting loop_step is emitted via `step_started`,
+        the output of the protocol via `info_step`."""
+        runner_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'bluesky_handling', 'protocol_runner.py')
+        cmd = [sys.executable, runner_path]
         if variables_handling.dark_mode:
-            args.append('--darkmode')
-        cmd = ['.desertenv/Scripts/pythonw', '-c', "from IPython import embed; embed()"]
-        self.popen = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                                      stderr=subprocess.STDOUT,
-                                      stdin=subprocess.PIPE, bufsize=1,
-                                      creationflags=subprocess.CREATE_NO_WINDOW)
-        self.write_to_console('%gui qt5')
-        self.write_to_console('import sys')
-        self.write_to_console('import importlib')
-        self.write_to_console('from PyQt5.QtWidgets import QApplication')
-        self.write_to_console('app = QApplication(sys.argv)')
-        self.write_to_console('import bluesky_handling.standard_imports')
-        for line in iter(self.popen.stdout.readline, b''):
-            text = line.decode().rstrip()
-            if text.startswith("starting loop_step "):
-                self.sig_step.emit(int(self.counter/self.total_time * 100))
-                self.counter += 1
-            elif text.startswith("protocol finished!"):
-                self.sig_step.emit(100)
-                self.protocol_done.emit()
-            else:
-                self.info_step.emit(text)
+            # the plots of the protocols check sys.argv for it
+            cmd.append('--darkmode')
+        creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        with self.send_lock:
+            self.spawn_time = time.time()
+            self.popen = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                          stdin=subprocess.PIPE,
+                                          cwd=os.path.dirname(os.path.dirname(runner_path)),
+                                          creationflags=creationflags)
+            for msg in self.pending_messages:
+                write_message(self.popen.stdin, msg)
+            self.pending_messages = []
+        while True:
+            msg = read_message(self.popen.stdout)
+            if msg is None:
+                break
+            self.handle_message(msg)
+        self.popen.wait()
         self.info_step.emit('\n\n\n')
         self.sig_step.emit(100)
 
-    def run_protocol(self, path, prot_time):
+    def handle_message(self, msg):
+        msg_type = msg['type']
+        if msg_type == 'step':
+            self.step_started.emit(msg['name'])
+        elif msg_type == 'first_event':
+            self.report_first_event()
+        elif msg_type in ('log', 'error'):
+            self.info_step.emit(msg['text'])
+        elif msg_type == 'paused':
+            self.paused = True
+            self.info_step.emit('protocol paused')
+        elif msg_type == 'finished':
+            self.paused = False
+            self.info_step.emit('protocol aborted!' if msg['aborted']
+                                else 'protocol finished!')
+            self.run_ended.emit(msg['aborted'])
+            self.sig_step.emit(100)
+            self.protocol_done.emit()
+        elif msg_type == 'ready':
+            self.startup_time = time.time() - self.spawn_time
+            self.ready.emit()
+
+    def report_first_event(self):
+        if self.first_event_time is not None or self.run_time is None:
+            return
+        self.first_event_time = time.time() - self.run_time
+        text = f'time to first event: {self.first_event_time:.2f} s'
+        if self.run_time >= self.spawn_time + self.startup_time:
+            text += f' (warm start, a cold start would take {self.first_event_time + self.startup_time:.2f} s)'
+        else:
+            text += f' (cold start, runner startup {self.startup_time:.2f} s)'
+        self.info_step.emit(text)
+
+    def send(self, msg_type, **kwargs):
+        """Sends a message to the runner, if it is not started yet, it
+        is sent as soon as it is."""
+        kwargs['type'] = msg_type
+        with self.send_lock:
+            if self.popen is None:
+                self.pending_messages.append(kwargs)
+                return
+            try:
+                write_message(self.popen.stdin, kwargs)
+            except OSError:
+                pass
+
+    def run_protocol(self, path):
         name = os.path.basename(path)[:-3]
         self.current_protocol = name
-        self.write_to_console(f'spec = importlib.util.spec_from_file_location("{name}", "{path}")')
-        self.write_to_console(f'{name}_mod = importlib.util.module_from_spec(spec)')
-        self.write_to_console(f'sys.modules[spec.name] = {name}_mod')
-        self.write_to_console(f'spec.loader.exec_module({name}_mod)')
-        self.counter = 0
-        self.total_time = prot_time
-        self.write_to_console(f'dat_{name} = {name}_mod.main()')
-        # self.write_to_console(f'print(dat_{name})')
+        self.run_time = time.time()
+        self.first_event_time = None
+        self.send('run', path=path, name=name)
+
+    def preload(self, modules, paths=()):
+        """Lets the runner import the given `modules` (e.g. the ophyd
+        classes of the devices) before a protocol is run."""
+        self.send('preload', modules=list(modules), paths=list(paths))
 
     def pause(self):
-        # os.kill(self.p.pid, signal.SIGINT)
-        # self.popen.stdin.write('print("test")\n'.encode())
-        # self.popen.stdin.flush()
-        self.popen.send_signal(signal.CTRL_C_EVENT)
+        self.send('pause')
         self.paused = True
 
     def abort(self):
-        if not self.paused:
-            self.pause()
-        msg = f'{self.current_protocol}_mod.RE.abort()'
-        self.write_to_console(msg)
-        self.popen.terminate()
-        self.terminate()
+        """Aborts the protocol, the runner exits afterwards (which
+        finishes the thread). If it does not exit within 5 seconds, it is
+        terminated. The waiting happens in a separate thread, so the GUI
+        does not freeze."""
+        self.send('abort')
+        if self.popen is not None:
+            threading.Thread(target=self.wait_or_terminate,
+                             args=(self.popen,), daemon=True).start()
+
+    def wait_or_terminate(self, popen, timeout=5):
+        try:
+            popen.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            popen.terminate()
 
     def resume(self):
-        msg = f'{self.current_protocol}_mod.RE.resume()'
-        self.write_to_console(msg)
+        self.paused = False
+        self.send('resume')
 
     def write_to_console(self, msg):
+        """Executes the python code `msg` in the runner, the modules of
+        the run protocols are available as "<name>_mod"."""
         if msg == 'exit()':
             raise Exception('Exiting the shell is not allowed!')
-        if self.popen is not None:
-            self.popen.stdin.write(bytes(f'{msg}\n', 'utf-8'))
-            self.popen.stdin.flush()
-            self.info_step.emit(f'{msg}\n')
+        self.send('exec', code=msg)
+
+    def terminate(self) -> None:
+        if self.popen is not None and self.popen.poll() is None:
+            self.popen.terminate()
+        super().terminate()
 
 
 class Run_IOC(QThread):
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+
+
+class Step_Statistics:
+    """Local store of the measured durations of loop_steps, saved as
+    json-file.
+
+    The durations are stored per work unit (e.g. per point of a sweep)
+    under several keys, from the specific step in a protocol over the
+    step type with its devices to only the step type, so there is an
+    estimate also for steps that never ran before. Each value is a
+    running mean, older runs lose weight after `max_weight` runs."""
+    max_weight = 20
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as file:
+                self.data = json.load(file)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.path, 'w') as file:
+            json.dump(self.data, file, indent=2)
+
+    def add(self, keys, duration):
+        """Adds the `duration` per work unit to all `keys`."""
+        for key in keys:
+            entry = self.data.setdefault(key, {'n': 0, 'mean': 0.})
+            entry['n'] = min(entry['n'] + 1, self.max_weight)
+            entry['mean'] += (duration - entry['mean']) / entry['n']
+
+    def get(self, keys):
+        """Returns the mean duration per work unit of the first of the
+        `keys` that is known, None if none is."""
+        for key in keys:
+            if key in self.data:
+                return self.data[key]['mean']
+        return None
+
+
+def get_step_keys(protocol_name, name, info):
+    """The keys for the statistics of the step `name` with `info` (see
+    Loop_Step.get_step_info), from specific to general."""
+    devices = ','.join(info['devices'])
+    return [f'{protocol_name}/{name}', f'{info["step_type"]}/{devices}',
+            info['step_type']]
+
+
+class Progress_Estimator:
+    """Estimates progress and remaining time of a running protocol.
+
+    Each start of a loop_step ends the previous one, which gives its
+    duration. The remaining time is the expected number of remaining
+    starts of each step times its duration per start, taken from this
+    run if the step already ran, otherwise from the `statistics`.
+    Steps without any estimate get the average of the known ones.
+    The time between `pause` and `resume` is not counted.
+
+    Parameters
+    ----------
+    protocol_name : str
+        Name of the protocol, used for the most specific statistics.
+    step_info : dict
+        The info of all steps, see Measurement_Protocol.get_step_info.
+    statistics : Step_Statistics, default None
+        The store of the durations of earlier runs.
+    """
+    def __init__(self, protocol_name, step_info, statistics=None):
+        self.protocol_name = protocol_name
+        self.step_info = step_info
+        self.statistics = statistics
+        self.keys = {name: get_step_keys(protocol_name, name, info)
+                     for name, info in step_info.items()}
+        self.done = {name: 0 for name in step_info}
+        self.durations = {name: [] for name in step_info}
+        self.current_step = None
+        self.step_start = None
+        self.start_time = None
+        self.pause_start = None
+        self.step_paused = 0
+        self.total_paused = 0
+
+    def start(self, t=None):
+        self.start_time = time.time() if t is None else t
+
+    def step_started(self, name, t=None):
+        """Called when the loop_step `name` starts at time `t`."""
+        t = time.time() if t is None else t
+        if self.start_time is None:
+            self.start_time = t
+        self.end_current_step(t)
+        self.current_step = name
+        self.step_start = t
+        self.step_paused = 0
+        if name not in self.done:
+            self.done[name] = 0
+            self.durations[name] = []
+        self.done[name] += 1
+
+    def end_current_step(self, t):
+        if self.current_step is not None:
+            units = self.step_info.get(self.current_step, {}).get('units', 1)
+            duration = self.get_running_time(t) / max(units, 1)
+            self.durations[self.current_step].append(duration)
+        self.current_step = None
+
+    def finish(self, t=None, aborted=False):
+        """Ends the run and adds the mean durations of the steps of this
+        run to the statistics. If `aborted`, the unfinished step is left
+        out."""
+        t = time.time() if t is None else t
+        if aborted:
+            self.current_step = None
+        self.end_current_step(t)
+        if self.statistics is None:
+            return
+        for name, durations in self.durations.items():
+            if durations and name in self.keys:
+                self.statistics.add(self.keys[name],
+                                    sum(durations) / len(durations))
+        try:
+            self.statistics.save()
+        except OSError as e:
+            print(f'Could not save the step statistics: {e}')
+
+    def pause(self, t=None):
+        """Called when the run is paused at time `t`."""
+        t = time.time() if t is None else t
+        if self.pause_start is None:
+            self.pause_start = t
+
+    def resume(self, t=None):
+        """Called when the run is resumed at time `t`, the time since
+        `pause` is left out of the durations."""
+        t = time.time() if t is None else t
+        if self.pause_start is None:
+            return
+        if self.step_start is not None:
+            self.step_paused += t - max(self.pause_start, self.step_start)
+        self.total_paused += t - self.pause_start
+        self.pause_start = None
+
+    def get_running_time(self, t, total=False):
+        """The time from the start of the current step (of the run if
+        `total`) to `t`, without the time paused."""
+        start = self.start_time if total else self.step_start
+        paused = self.total_paused if total else self.step_paused
+        if self.pause_start is not None:
+            paused += t - max(self.pause_start, start)
+        return t - start - paused
+
+    def get_unit_duration(self, name):
+        """The expected duration per work unit of step `name`."""
+        if self.durations.get(name):
+            return sum(self.durations[name]) / len(self.durations[name])
+        if self.statistics is not None and name in self.keys:
+            return self.statistics.get(self.keys[name])
+        return None
+
+    def get_remaining(self, t=None):
+        """Returns the estimated remaining time in seconds, None if
+        nothing is known yet."""
+        t = time.time() if t is None else t
+        estimates = {}
+        for name in self.step_info:
+            duration = self.get_unit_duration(name)
+            if duration is not None:
+                estimates[name] = duration
+        if not estimates:
+            return None
+        fallback = sum(estimates.values()) / len(estimates)
+        remaining = 0
+        for name, info in self.step_info.items():
+            duration = estimates.get(name, fallback) * max(info['units'], 1)
+            remaining += max(info['count'] - self.done.get(name, 0), 0) * duration
+            if name == self.current_step:
+                remaining += max(duration - self.get_running_time(t), 0)
+        return remaining
+
+    def get_progress(self, t=None):
+        """Returns the progress in percent (elapsed time relative to the
+        estimated total time) and the remaining time in seconds (None if
+        unknown)."""
+        t = time.time() if t is None else t
+        remaining = self.get_remaining(t)
+        if remaining is None or self.start_time is None:
+            return 0, remaining
+        elapsed = self.get_running_time(t, total=True)
+        if elapsed + remaining <= 0:
+            return 0, remaining
+        return min(int(elapsed / (elapsed + remaining) * 100), 99), remaining
+
+    def get_throughput(self):
+        """Returns the work units per second of the current step, None
+        if unknown."""
+        if self.current_step is None:
+            return None
+        duration = self.get_unit_duration(self.current_step)
+        if not duration:
+            return None
+        return 1 / duration
+
+    def get_progress_text(self, t=None):
+        """The text for the progress bar, containing the percentage, the
+        ETA and the throughput of the current step."""
+        t = time.time() if t is None else t
+        percent, remaining = self.get_progress(t)
+        text = f'{percent}%'
+        if remaining is not None:
+            finish = time.strftime('%H:%M', time.localtime(t + remaining))
+            text += f' - {format_duration(remaining)} left (ETA {finish})'
+        throughput = self.get_throughput()
+        if throughput is not None:
+            units = self.step_info.get(self.current_step, {}).get('units', 1)
+            unit_name = 'points' if units > 1 else 'steps'
+            if throughput >= 1:
+                text += f' - {throughput:.3g} {unit_name}/s'
+            else:
+                text += f' - {1 / throughput:.3g} s per {unit_name[:-1]}'
+        return percent, text
+
+
+def format_duration(seconds):
+    """Formats `seconds` as e.g. "1h 05m", "4m 12s" or "17s"."""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f'{hours}h {minutes:02d}m'
+    if minutes:
+        return f'{minutes}m {seconds:02d}s'
+    return f'{seconds}s'